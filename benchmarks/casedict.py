@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""CaseInsensitiveDict construction and lookup benchmark.
+
+Compares modules.cosmetics.CaseInsensitiveDict with the previous
+implementation, kept below as LegacyCaseInsensitiveDict.
+
+Run from the repository root::
+
+    python -m benchmarks.casedict --sizes 50000
+"""
+import argparse
+import json
+import random
+import timeit
+from typing import Callable, List, Tuple
+
+from modules.cosmetics import CaseInsensitiveDict
+
+from .catalog import make_items
+
+
+class LegacyCaseInsensitiveDict(dict):
+    def __init__(self, v=None, **kwarg):
+        super().__init__(self.casefold(v, **kwarg))
+
+    def casefold(self, v, **kwarg):
+        data = {}
+        if v is not None:
+            if isinstance(v, dict):
+                for k, v in v.items():
+                    if isinstance(k, str):
+                        k = k.casefold()
+                    data[k] = v
+            else:
+                for k, v in v:
+                    if isinstance(k, str):
+                        k = k.casefold()
+                    data[k] = v
+        for k, v in kwarg.items():
+            if isinstance(k, str):
+                k = k.casefold()
+            data[k] = v
+        return data
+
+    def __contains__(self, k):
+        if isinstance(k, str):
+            k = k.casefold()
+        return super().__contains__(k)
+
+    def __getitem__(self, k):
+        if isinstance(k, str):
+            k = k.casefold()
+        return super().__getitem__(k)
+
+    def get(self, k, default=None):
+        if isinstance(k, str):
+            k = k.casefold()
+        return super().get(k, default)
+
+
+def measure(func: Callable[[], object], number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1000
+
+
+def run(size: int) -> None:
+    items = make_items(size, 'en', seed=1)
+    # Catalog files are written from CaseInsensitiveDicts, so their keys are
+    # already folded
+    folded = json.loads(json.dumps(CaseInsensitiveDict(items)))
+    raw = {value['id']: value for value in items.values()}
+    rng = random.Random(2)
+    ids = [rng.choice(list(raw)) for _ in range(10000)]
+    folded_ids = [id.casefold() for id in ids]
+
+    print(f'\n{size} keys')
+    for cls in (LegacyCaseInsensitiveDict, CaseInsensitiveDict):
+        catalog = cls(raw)
+        cases: List[Tuple[str, Callable[[], object], int]] = [
+            ('build (folded keys)', lambda: cls(folded), 5),
+            ('build (raw ids)', lambda: cls(raw), 5),
+            ('copy', lambda: cls(catalog), 5),
+            ('get (folded)', lambda: [catalog.get(id) for id in folded_ids], 5),
+            ('get (raw)', lambda: [catalog.get(id) for id in ids], 5),
+            ('[] (folded)', lambda: [catalog[id] for id in folded_ids], 5),
+            ('in (raw)', lambda: [id in catalog for id in ids], 5)
+        ]
+        print(f'  {cls.__name__}')
+        for name, func, number in cases:
+            print(f'    {name:<22} {measure(func, number):8.3f} ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50000])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run(size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import random
+from typing import Dict, List, Optional
+
+from modules.records import BACKEND_TO_API_CONVERTER, BACKEND_TO_ID_CONVERTER, ITEM_TYPES
+
+LATIN_WORDS = [
+    'renegade', 'raider', 'black', 'knight', 'skull', 'trooper', 'floss',
+    'galaxy', 'ghoul', 'aerial', 'assault', 'leviathan', 'drift', 'omega',
+    'ragnarok', 'carbide', 'lynx', 'midas', 'peely', 'jonesy', 'shadow',
+    'storm', 'crystal', 'neon', 'party', 'beach', 'frost', 'reaper'
+]
+JAPANESE_WORDS = [
+    'レネゲード', 'レイダー', 'ブラック', 'ナイト', 'スカル', 'トルーパー',
+    'フロス', 'ギャラクシー', '闇', '騎士', '氷', '炎', 'ドリフト', 'オメガ',
+    'ラグナロク', '海賊', '忍者', 'ピーリー', 'ジョーンジー', '嵐', '影',
+    'ゆきんこ', 'さくら', 'ミダス', '星空', '伝説', '王'
+]
+
+
+def make_name(rng: random.Random, lang: str) -> str:
+    if lang == 'mixed':
+        lang = rng.choice(['en', 'ja'])
+    if lang == 'ja':
+        return ''.join(rng.choice(JAPANESE_WORDS) for _ in range(rng.randint(1, 3)))
+    return ' '.join(rng.choice(LATIN_WORDS).title() for _ in range(rng.randint(1, 3)))
+
+
+def make_variants(rng: random.Random, lang: str) -> Optional[List[dict]]:
+    if rng.random() < 0.7:
+        return None
+    return [
+        {
+            'name': make_name(rng, lang),
+            'variants': [
+                {
+                    'c': rng.choice(['Material', 'Parts', 'Progressive']),
+                    'v': f'Mat{num}',
+                    'dE': 0
+                }
+            ]
+        } for num in range(rng.randint(1, 6))
+    ]
+
+
+def make_items(size: int, lang: str, seed: Optional[int] = 0) -> Dict[str, dict]:
+    """Generate a catalog shaped like the output of Bot.format_items."""
+    rng = random.Random(seed)
+    sets = [make_name(rng, lang) for _ in range(max(size // 20, 1))]
+    items = {}
+    for num in range(size):
+        backend = rng.choice(ITEM_TYPES)
+        prefix = BACKEND_TO_ID_CONVERTER.get(backend, backend)
+        id = f'{prefix}_{num:05d}_{rng.choice(LATIN_WORDS)}'
+        items[id] = {
+            'id': id,
+            'name': make_name(rng, lang),
+            'type': {
+                'value': BACKEND_TO_API_CONVERTER[backend],
+                'displayValue': BACKEND_TO_API_CONVERTER[backend].title(),
+                'backendValue': backend
+            },
+            'set': rng.choice(sets) if rng.random() < 0.4 else None,
+            'variants': make_variants(rng, lang)
+        }
+    return items
+
+
+def make_playlists(size: int, lang: str, seed: Optional[int] = 0) -> Dict[str, dict]:
+    rng = random.Random(seed)
+    playlists = {}
+    for num in range(size):
+        id = f'Playlist_{rng.choice(LATIN_WORDS).title()}_{num}'
+        playlists[id] = {'id': id, 'name': make_name(rng, lang)}
+    return playlists
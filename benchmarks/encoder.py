@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Catalog encoding with the pure Python encoder versus the C encoder path.
+
+Run from the repository root::
+
+    python -m benchmarks.encoder --sizes 5000 20000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Callable, List, Tuple
+
+from modules.cosmetics import CaseInsensitiveDict
+from modules.encoder import MyJSONEncoder
+from modules.store import write_json
+
+from .catalog import make_items, make_playlists
+
+
+def measure(func: Callable[[], object], repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def legacy_encode(value: dict) -> str:
+    # iterencode without _one_shot always takes the pure Python path, which
+    # is what every dump went through before
+    return ''.join(MyJSONEncoder(ensure_ascii=False).iterencode(value))
+
+
+def legacy_write(filename: str, value: dict) -> None:
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(value, f, ensure_ascii=False, cls=MyJSONEncoder)
+
+
+def run(size: int, lang: str, directory: str) -> None:
+    catalogs = [
+        ('items', {'api': 'BenBot', 'items': CaseInsensitiveDict(make_items(size, lang, seed=1))}),
+        ('playlists', {'api': 'BenBot', 'playlists': CaseInsensitiveDict(
+            make_playlists(max(size // 100, 10), lang, seed=3)
+        )})
+    ]
+    filename = os.path.join(directory, 'catalog.json')
+
+    print(f'\n{size} items, lang={lang}')
+    for name, catalog in catalogs:
+        encoded = json.dumps(catalog, ensure_ascii=False, cls=MyJSONEncoder)
+        if encoded != legacy_encode(catalog):
+            raise AssertionError(f'{name}: encoded output differs')
+        cases: List[Tuple[str, Callable[[], object]]] = [
+            ('encode (pure Python)', lambda: legacy_encode(catalog)),
+            ('encode (C)', lambda: json.dumps(catalog, ensure_ascii=False, cls=MyJSONEncoder)),
+            ('write (json.dump)', lambda: legacy_write(filename, catalog)),
+            ('write (write_json)', lambda: write_json(filename, catalog, compact=True))
+        ]
+        print(f'  {name} ({len(encoded) / 1024 / 1024:.1f} MiB)')
+        for case, func in cases:
+            print(f'    {case:<22} {measure(func):8.1f} ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5000, 20000])
+    parser.add_argument('--langs', nargs='+', default=['en', 'ja'])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            for lang in args.langs:
+                run(size, lang, directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Memory of catalog records as nested dicts versus slotted records.
+
+Run from the repository root::
+
+    python -m benchmarks.records --sizes 5000 20000 50000
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+
+from modules.records import Cosmetic, Playlist
+
+from .catalog import make_items, make_playlists
+
+
+def measure(build: Callable[[], list]) -> Tuple[float, float]:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    records = build()
+    elapsed = (time.perf_counter() - start) * 1000
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return current, elapsed
+
+
+def run(size: int, lang: str) -> None:
+    # Serialize first so that both sides are built from scratch, the way
+    # they are when a catalog is loaded
+    items = json.dumps(list(make_items(size, lang, seed=1).values()))
+    playlists = json.dumps(list(make_playlists(max(size // 100, 10), lang, seed=3).values()))
+
+    cases: List[Tuple[str, Callable[[], list]]] = [
+        ('dict items', lambda: json.loads(items)),
+        ('Cosmetic items', lambda: [Cosmetic.from_dict(item) for item in json.loads(items)]),
+        ('dict playlists', lambda: json.loads(playlists)),
+        ('Playlist playlists', lambda: [
+            Playlist.from_dict(playlist) for playlist in json.loads(playlists)
+        ])
+    ]
+
+    print(f'\n{size} items, lang={lang}')
+    for name, build in cases:
+        current, elapsed = measure(build)
+        print(f'  {name:<20} {current / 1024 / 1024:8.2f} MiB  build {elapsed:8.1f} ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5000, 20000, 50000])
+    parser.add_argument('--langs', nargs='+', default=['en', 'ja'])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        for lang in args.langs:
+            run(size, lang)
+
+
+if __name__ == '__main__':
+    main()
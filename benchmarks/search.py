@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""Searcher latency benchmark over synthetic catalogs.
+
+Each case is also timed on a baseline that normalizes every item again on
+each query, as the searcher did before the precomputed columns.
+
+Run from the repository root::
+
+    python -m benchmarks.search --sizes 5000 20000 --langs en ja mixed
+"""
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+from typing import Callable, List, Optional
+
+import jaconv
+from pykakasi import kakasi
+
+from modules.cosmetics import CaseInsensitiveDict, CosmeticIndex, Searcher
+from modules.normalizer import Normalizer
+
+from .catalog import make_items, make_playlists
+
+
+class BaselineSearcher:
+    def __init__(self, main_items: dict, sub_items: dict,
+                 main_playlists: dict, sub_playlists: dict,
+                 case_insensitive: bool, convert_kanji: bool) -> None:
+        self.main_items = main_items
+        self.sub_items = sub_items
+        self.main_playlists = main_playlists
+        self.sub_playlists = sub_playlists
+        self.case_insensitive = case_insensitive
+        self.convert_kanji = convert_kanji
+        self.kakasi = kakasi()
+        self.kakasi.setMode('J', 'H')
+        self.converter = self.kakasi.getConverter()
+
+    def normalize(self, text: str) -> str:
+        if self.case_insensitive:
+            text = jaconv.kata2hira(text.casefold())
+        if self.convert_kanji:
+            text = self.converter.do(text)
+        return text
+
+    def search_item(self, mode: str, text: str,
+                    item: Optional[str] = None) -> List[dict]:
+        text = self.normalize(text)
+
+        def find(items):
+            result = []
+            for cosmetic in items.values():
+                if (item and cosmetic['type']['backendValue'] not in item.split(',')
+                        or cosmetic['name'] is None):
+                    continue
+                if mode == 'name':
+                    if text in self.normalize(cosmetic['name']):
+                        result.append(cosmetic)
+                elif mode == 'id':
+                    if text in cosmetic['id'].casefold():
+                        result.append(cosmetic)
+            return result
+
+        return find(self.main_items) or find(self.sub_items)
+
+    def search_item_name_id(self, text: str,
+                            item: Optional[str] = None) -> List[dict]:
+        items = self.search_item('name', text, item)
+        if len(items) == 0:
+            items = self.search_item('id', text, item)
+        return items
+
+    def search_style(self, id: str, text: str) -> List[dict]:
+        text = self.normalize(text)
+        item = self.main_items.get(id)
+        if item is None or item.get('variants') is None:
+            return []
+        return [
+            style for style in item['variants']
+            if text in self.normalize(style['name'])
+        ]
+
+    def search_playlist(self, mode: str, text: str) -> List[dict]:
+        text = self.normalize(text)
+
+        def find(playlists):
+            result = []
+            for playlist in playlists.values():
+                if mode == 'name':
+                    if text in self.normalize(playlist['name']):
+                        result.append(playlist)
+                elif mode == 'id':
+                    if text in playlist['id'].casefold():
+                        result.append(playlist)
+            return result
+
+        return find(self.main_playlists) or find(self.sub_playlists)
+
+
+def percentile(data: List[float], pct: float) -> float:
+    data = sorted(data)
+    return data[min(int(len(data) * pct / 100), len(data) - 1)]
+
+
+def make_queries(rng: random.Random, items: dict, count: int) -> List[str]:
+    values = list(items.values())
+    queries = []
+    for _ in range(count):
+        cosmetic = rng.choice(values)
+        kind = rng.random()
+        if kind < 0.4:
+            name = cosmetic['name']
+            start = rng.randint(0, max(len(name) - 3, 0))
+            queries.append(name[start:start + rng.randint(3, 8)])
+        elif kind < 0.55:
+            queries.append(cosmetic['name'])
+        elif kind < 0.7:
+            queries.append(cosmetic['id'][:rng.randint(4, 10)])
+        elif kind < 0.85:
+            name = list(cosmetic['name'])
+            name[rng.randrange(len(name))] = 'x'
+            queries.append(''.join(name))
+        else:
+            queries.append(rng.choice(['a', 'ス', 'zz', 'no such cosmetic']))
+    return queries
+
+
+def measure(func: Callable, args: List[tuple]) -> List[float]:
+    timings = []
+    for arg in args:
+        start = time.perf_counter()
+        func(*arg)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def run(size: int, lang: str, queries: int, baseline_queries: int,
+        ngram: bool, cache: bool, convert_kanji: bool) -> None:
+    items = CaseInsensitiveDict(make_items(size, lang, seed=1))
+    sub_items = CaseInsensitiveDict(make_items(size, 'en', seed=2))
+    playlists = CaseInsensitiveDict(make_playlists(max(size // 100, 10), lang, seed=3))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = CosmeticIndex(
+        Normalizer(cache_size=65536 if cache else 0),
+        ngram=ngram,
+        cache_size=1024 if cache else 0,
+        sub_loader=lambda: (sub_items, CaseInsensitiveDict())
+    )
+    index.load(items, playlists)
+    searcher = Searcher(index, True, convert_kanji)
+    searcher.catalogs
+    searcher.sub_catalogs
+    build = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    baseline = BaselineSearcher(
+        items,
+        sub_items,
+        playlists,
+        CaseInsensitiveDict(),
+        True,
+        convert_kanji
+    )
+
+    rng = random.Random(4)
+    texts = make_queries(rng, items, queries)
+    ids = [rng.choice(list(items)) for _ in range(queries)]
+    cases = {
+        'search_item(name)': (
+            searcher.search_item,
+            baseline.search_item,
+            [('name', t) for t in texts]
+        ),
+        'search_item(outfit)': (
+            searcher.search_item,
+            baseline.search_item,
+            [('name', t, 'AthenaCharacter') for t in texts]
+        ),
+        'search_item_name_id': (
+            searcher.search_item_name_id,
+            baseline.search_item_name_id,
+            [(t,) for t in texts]
+        ),
+        'search_item_ranked': (searcher.search_item_ranked, None, [(t,) for t in texts]),
+        'search_style': (
+            searcher.search_style,
+            baseline.search_style,
+            [(id, t[:3]) for id, t in zip(ids, texts)]
+        ),
+        'search_playlist': (
+            searcher.search_playlist,
+            baseline.search_playlist,
+            [('name', t) for t in texts]
+        )
+    }
+
+    print(f'\n{size} items, lang={lang}, ngram={ngram}, cache={cache}, '
+          f'convert_kanji={convert_kanji}')
+    print(f'  index build: {build:.1f} ms, peak memory {peak / 1024 / 1024:.1f} MiB')
+    for name, (func, baseline_func, args) in cases.items():
+        timings = measure(func, args)
+        line = (f'  {name:<22} p50 {statistics.median(timings):8.3f} ms'
+                f'  p99 {percentile(timings, 99):8.3f} ms')
+        if baseline_func is not None and baseline_queries:
+            # The baseline is slow, so it only runs the first queries
+            baseline_timings = measure(baseline_func, args[:baseline_queries])
+            line += (f'  baseline p50 {statistics.median(baseline_timings):9.3f} ms'
+                     f'  p99 {percentile(baseline_timings, 99):9.3f} ms')
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5000, 20000, 50000])
+    parser.add_argument('--langs', nargs='+', default=['en', 'ja', 'mixed'])
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--baseline-queries', type=int, default=50,
+                        help='queries timed on the baseline, 0 to skip it')
+    parser.add_argument('--no-ngram', action='store_true',
+                        help='use the linear column scan instead of the n-gram index')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='disable the result and normalization caches')
+    parser.add_argument('--convert-kanji', action='store_true')
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        for lang in args.langs:
+            run(size, lang, args.queries, args.baseline_queries,
+                not args.no_ngram, not args.no_cache, args.convert_kanji)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import asyncio
+import copy
 import datetime
+import hashlib
 import io
 import json
 import logging
@@ -9,27 +11,34 @@ import platform
 import re
 import sys
 import textwrap
+import time
 import traceback
 from contextlib import redirect_stderr, redirect_stdout
 from functools import partial
 from glob import glob
 from logging import WARNING, getLogger
-from typing import Any, Callable, List, Optional, Tuple, Union
+from typing import Any, Awaitable, Callable, List, Optional, Tuple, Union
 
 import aiohttp
 import discord
 import fortnitepy
 import sanic
-from pykakasi import kakasi
 
 from .client import Client, MyClientParty, MyClientPartyMember
 from .colors import cyan, green, red, yellow
 from .commands import Command, DefaultCommands, MyMessage, PartyPrivacy
-from .cosmetics import CaseInsensitiveDict, Searcher
+from .cosmetics import CaseInsensitiveDict, CosmeticIndex, Searcher
 from .device_code import Auth, HTTPClient
 from .discord_client import DiscordClient
-from .encoder import MyJSONEncoder
 from .localize import LocalizedText
+from .normalizer import Normalizer
+from .records import (API_TO_BACKEND_CONVERTER, BACKEND_TO_API_CONVERTER,
+                      BACKEND_TO_ID_CONVERTER, BACKEND_TO_KEY_CONVERTER, ITEM_TYPES,
+                      Cosmetic, Playlist)
+from .snapshot import (BANNER_FIELDS, ITEM_FIELDS, PLAYLIST_FIELDS, SnapshotDict,
+                       SnapshotError, write_snapshot)
+from .store import (STATE_DOCUMENTS, FileStorage, JSONStore, ReplitStorage,
+                    SQLiteStorage, Storage, dump_entry, loads, write_json)
 from .web import Web, WebMessage, WebUser
 from .webhook import WebhookClient
 
@@ -77,65 +86,22 @@ sys.stderr = MyStream(sys.stderr, red)
 
 
 class Bot:
-    BACKEND_TO_API_CONVERTER = {
-        'AthenaBackpack': 'backpack',
-        'AthenaPickaxe': 'pickaxe',
-        'AthenaItemWrap': 'wrap',
-        'AthenaGlider': 'glider',
-        'AthenaCharacter': 'outfit',
-        'AthenaPet': 'pet',
-        'AthenaMusicPack': 'music',
-        'AthenaLoadingScreen': 'loadingscreen',
-        'AthenaDance': 'emote',
-        'AthenaSpray': 'spray',
-        'AthenaEmoji': 'emoji',
-        'AthenaSkyDiveContrail': 'contrail',
-        'AthenaPetCarrier': 'petcarrier',
-        'AthenaToy': 'toy',
-        'AthenaConsumableEmote': 'consumableemote',
-        'AthenaBattleBus': 'battlebus',
-        'AthenaVictoryPose': 'ridethepony',
-        'BannerToken': 'banner'
-    }
-    API_TO_BACKEND_CONVERTER = {
-        v: k for k, v in BACKEND_TO_API_CONVERTER.items()
-    }
-    BACKEND_TO_KEY_CONVERTER = {
-        'AthenaBackpack': 'backpack',
-        'AthenaPickaxe': 'pickaxe',
-        'AthenaItemWrap': 'wrap',
-        'AthenaGlider': 'glider',
-        'AthenaCharacter': 'outfit',
-        'AthenaPet': 'backpack',
-        'AthenaMusicPack': 'music',
-        'AthenaLoadingScreen': 'loadingscreen',
-        'AthenaDance': 'emote',
-        'AthenaSpray': 'emote',
-        'AthenaEmoji': 'emote',
-        'AthenaSkyDiveContrail': 'contrail',
-        'AthenaPetCarrier': 'backpack',
-        'AthenaToy': 'emote',
-        'AthenaConsumableEmote': 'emote',
-        'AthenaBattleBus': 'battlebus',
-        'AthenaVictoryPose': 'emote',
-        'BannerToken': 'banner'
-    }
-    BACKEND_TO_ID_CONVERTER = {
-        'AthenaCharacter': 'CID',
-        'AthenaBackpack': 'BID',
-        'AthenaPetCarrier': 'PetCarrier',
-        'AthenaPet': 'PetID',
-        'AthenaPickaxe': 'Pickaxe_ID',
-        'AthenaDance': 'EID',
-        'AthenaEmoji': 'Emoji',
-        'AthenaToy': 'Toy',
-        'AthenaConsumableEmote': 'EID',
-    }
+    BACKEND_TO_API_CONVERTER = BACKEND_TO_API_CONVERTER
+    ITEM_TYPES = ITEM_TYPES
+    API_TO_BACKEND_CONVERTER = API_TO_BACKEND_CONVERTER
+    BACKEND_TO_KEY_CONVERTER = BACKEND_TO_KEY_CONVERTER
+    BACKEND_TO_ID_CONVERTER = BACKEND_TO_ID_CONVERTER
 
     def __init__(self, mode: str, loop: asyncio.AbstractEventLoop) -> None:
         self.loop = loop
 
         self.mode = mode
+        self.files = FileStorage()
+        if self.mode == 'repl':
+            self.storage = ReplitStorage(db)
+        else:
+            self.storage = self.files
+        self.store = JSONStore(self.loop, self.storage, on_error=self.print_exception)
 
         self.clients = []
         self.web = Web(self, __name__)
@@ -153,8 +119,7 @@ class Bot:
         self.return_pattern = re.compile(
             r'(?P<space>\s*)(return|return\s+(?P<text>.*))\s*'
         )
-        self.kakasi = kakasi()
-        self.kakasi.setMode('J', 'H')
+        self.normalizer = Normalizer()
         self.localize = None
 
         self.all_commands = {
@@ -248,6 +213,13 @@ class Bot:
                 'display_value': self.l(f'loglevel_{i}', default=i)
             } for i in ['normal', 'info', 'debug']
         ]
+        self.select_storage = [
+            {
+                'real_value': i,
+                'value': i,
+                'display_value': i
+            } for i in ['file', 'sqlite']
+        ]
 
         self.multiple_select_user_type = [
             {
@@ -291,6 +263,10 @@ class Bot:
             "['sub_search_lang']": [str, 'select_api_lang'],
             "['api']": [str, 'select_api'],
             "['api_key']": [str, 'can_be_none'],
+            "['refresh_concurrency']": [int, 'lambda x: x > 0'],
+            "['refresh_timeout']": [int, 'lambda x: x > 0'],
+            "['refresh_interval']": [int, 'can_be_none'],
+            "['storage']": [str, 'select_storage'],
             "['discord_log']": [str, 'can_be_none'],
             "['hide_email']": [bool, 'select_bool'],
             "['hide_password']": [bool, 'select_bool'],
@@ -456,6 +432,9 @@ class Bot:
         }
 
         self.cosmetic_presets = None
+        self.index = CosmeticIndex(self.normalizer, sub_loader=self.read_sub_data)
+        self.searcher = None
+        self.refresher = None
 
         self.config_item_pattern = re.compile(
             r"<Item name='(?P<name>.+)' "
@@ -498,27 +477,31 @@ class Bot:
     def is_error(self) -> None:
         return self.error_config or self.error_commands
 
-    def get_device_auth_details(self) -> None:
-        if self.isfile('device_auths'):
-            return self.load_json('device_auths')
+    def get_stored_json(self, key: str) -> dict:
+        # The store keeps the loaded value, and later saves mutate it instead
+        # of reading the document again
+        if key in self.store:
+            return self.store.get(key)
+        if self.isfile(key):
+            value = self.load_json(key)
         else:
-            return {}
+            value = {}
+        self.store.load(key, value)
+        return value
+
+    def get_device_auth_details(self) -> None:
+        return self.get_stored_json('device_auths')
 
     def store_device_auth_details(self, email: str, details: dict) -> None:
-        existing = self.get_device_auth_details()
-        existing[email.lower()] = details
-        self.save_json('device_auths', existing)
+        self.get_device_auth_details()
+        self.store.set_entry('device_auths', email.lower(), details)
 
     def get_cosmetic_presets(self) -> None:
-        if self.isfile('cosmetic_presets'):
-            return self.load_json('cosmetic_presets')
-        else:
-            return {}
+        return self.get_stored_json('cosmetic_presets')
 
     def store_cosmetic_presets(self, account_id: str, details: dict) -> None:
-        existing = self.get_cosmetic_presets()
-        existing[account_id] = details
-        self.save_json('cosmetic_presets', existing)
+        self.get_cosmetic_presets()
+        self.store.set_entry('cosmetic_presets', account_id, details)
 
     def convert_td(self, td: datetime.timedelta) -> Tuple[int, int, int, int]:
         m, s = divmod(td.seconds, 60)
@@ -526,82 +509,54 @@ class Bot:
         d, h = divmod(h, 24)
         return d, h, m, s
 
+    def get_storage(self, force_file: Optional[bool] = False) -> Storage:
+        if force_file:
+            return self.files
+        return self.storage
+
+    def use_storage(self, storage: Storage) -> None:
+        self.storage = storage
+        self.store.backend = storage
+
     def isfile(self, key: str, force_file: Optional[bool] = False) -> bool:
-        if self.mode == 'repl' and not force_file:
-            if db.get(key) is None:
-                return False
-        else:
-            if not os.path.isfile(f'{key}.json'):
-                return False
-        return True
+        if key in self.store and not force_file:
+            return True
+        return self.get_storage(force_file).exists(key)
 
     def remove(self, key: str, force_file: Optional[bool] = False) -> None:
-        if self.mode == 'repl' and not force_file:
-            try:
-                del db[key]
-            except KeyError as e:
-                raise FileNotFoundError from e
-        else:
-            os.remove(f'{key}.json')
+        stored = not force_file and self.store.discard(key)
+        try:
+            self.get_storage(force_file).remove(key)
+        except FileNotFoundError:
+            if not stored:
+                raise
 
     def rename(self, key_src: str, key_dst: str, force_file: Optional[bool] = False) -> None:
-        if self.mode == 'repl' and not force_file:
-            try:
-                db[key_dst] = db[key_src]
-                del db[key_src]
-            except KeyError as e:
-                raise FileNotFoundError from e
-        else:
-            os.rename(f'{key_src}.json', f'{key_dst}.json')
+        if not force_file:
+            self.store.flush_sync([key_src])
+            self.store.discard(key_src)
+            self.store.discard(key_dst)
+        self.get_storage(force_file).rename(key_src, key_dst)
 
     def load_json(self, key: str, force_file: Optional[bool] = False) -> Union[dict, list]:
-        if self.mode == 'repl' and not force_file:
-            return db[key]['value']
-        else:
-            try:
-                with open(f'{key}.json', encoding='utf-8') as f:
-                    data = f.read()
-            except UnicodeDecodeError:
-                try:
-                    with open(f'{key}.json', encoding='utf-8-sig') as f:
-                        data = f.read()
-                except UnicodeDecodeError:
-                    with open(f'{key}.json', encoding='shift_jis') as f:
-                        data = f.read()
-            return json.loads(data)
+        if not force_file:
+            # Only the state documents are served from memory. config and
+            # commands are read again so that edits to them are picked up
+            if key in STATE_DOCUMENTS and key in self.store:
+                return copy.deepcopy(self.store.get(key))
+            self.store.flush_sync([key])
+        return self.get_storage(force_file).load(key)
 
     def save_json(self, key: str, value: Union[dict, list],
                   force_file: Optional[bool] = False,
                   compact: Optional[bool] = False) -> None:
-        if self.mode == 'repl' and not force_file:
-            db[key] = {
-                'last_edited': self.utcnow(),
-                'value': self.json_serializer(value)
-            }
+        if force_file:
+            write_json(f'{key}.json', value, compact)
         else:
-            with open(f'{key}.json', 'w', encoding='utf-8') as f:
-                if compact:
-                    json.dump(
-                        value,
-                        f,
-                        ensure_ascii=False,
-                        cls=MyJSONEncoder
-                    )
-                else:
-                    json.dump(
-                        value,
-                        f,
-                        indent=4,
-                        ensure_ascii=False,
-                        cls=MyJSONEncoder
-                    )
+            self.store.set(key, value, compact)
 
     def get_last_edited(self, key: str, force_file: Optional[bool] = False) -> datetime.datetime:
-        if self.mode == 'repl' and not force_file:
-            return datetime.datetime.fromisoformat(db[key]['last_edited'])
-        else:
-            stat = os.stat(f'{key}.json')
-            return datetime.datetime.fromtimestamp(stat.st_mtime)
+        return self.get_storage(force_file).last_edited(key)
 
     def is_not_edited_for(self, key: str, td: datetime.timedelta, force_file: Optional[bool] = False) -> bool:
         last_edited = self.get_last_edited(key)
@@ -790,6 +745,10 @@ class Bot:
         self.set_dict_key_default(config, ['lang'], 'en')
         self.set_dict_key_default(config, ['api'], 'BenBot')
         self.set_dict_key_default(config, ['api_key'], None)
+        self.set_dict_key_default(config, ['refresh_concurrency'], 4)
+        self.set_dict_key_default(config, ['refresh_timeout'], 60)
+        self.set_dict_key_default(config, ['refresh_interval'], 120)
+        self.set_dict_key_default(config, ['storage'], 'file')
         self.set_dict_key_default(config, ['discord_log'], None)
         self.set_dict_key_default(config, ['loglevel'], 'normal')
         self.set_dict_key_default(config, ['debug'], False)
@@ -1295,6 +1254,8 @@ class Bot:
                 ),
                 file=sys.stderr
             )
+        if self.config['storage'] == 'sqlite' and self.mode != 'repl':
+            self.use_storage(SQLiteStorage('storage.sqlite3', STATE_DOCUMENTS, self.files))
         self.webhook = WebhookClient(self, self, self.loop, self.http)
         self.webhook.start()
         if self.config['discord']['enabled']:
@@ -1414,116 +1375,367 @@ class Bot:
                 'variants': None
             }
 
+    def format_kept_item(self, data: dict, mode: str) -> Optional[dict]:
+        item = self.format_item(data, mode)
+        if item['type']['backendValue'] in self.ITEM_TYPES:
+            return item
+        return None
+
     def format_items(self, data: list, mode: str) -> list:
-        types = [
-            'AthenaCharacter',
-            'AthenaBackpack',
-            'AthenaPet',
-            'AthenaPetCarrier',
-            'AthenaPickaxe',
-            'AthenaDance',
-            'AthenaEmoji',
-            'AthenaToy'
-        ]
-        return [item for item in [
-            self.format_item(item, mode)
-            for item in sorted(data, key=lambda x: x['id'])
-        ] if item['type']['backendValue'] in types]
+        return sorted([item for item in [
+            self.format_kept_item(item, mode)
+            for item in data
+        ] if item is not None], key=lambda x: x['id'])
+
+    def load_catalog_manifest(self, key: str) -> dict:
+        if (not self.isfile(key, force_file=True)
+                or not self.isfile(f'{key}.meta', force_file=True)):
+            return {}
+        try:
+            return self.load_json(f'{key}.meta', force_file=True)
+        except (json.decoder.JSONDecodeError, UnicodeDecodeError) as e:
+            self.debug_print_exception(e)
+            return {}
 
-    async def get_item_data(self, lang: str) -> list:
+    def store_catalog_manifest(self, key: str, lang: Optional[str],
+                               metadata: dict, count: Optional[int] = None,
+                               journal: Optional[Tuple[str, int]] = None) -> None:
+        manifest = self.load_catalog_manifest(key)
+        now = datetime.datetime.utcnow().isoformat()
+        if count is not None:
+            if journal is None:
+                sha256 = hashlib.sha256()
+                with open(f'{key}.json', 'rb') as f:
+                    for chunk in iter(partial(f.read, 1024 * 1024), b''):
+                        sha256.update(chunk)
+                content_hash, journal_size = sha256.hexdigest(), 0
+                manifest['base_hash'] = content_hash
+            else:
+                content_hash, journal_size = journal
+            manifest.update({
+                'fetched_at': now,
+                'count': count,
+                'content_hash': content_hash,
+                'journal_size': journal_size
+            })
+        manifest.update({
+            'api': self.config['api'],
+            'lang': lang,
+            'checked_at': now,
+            'http': metadata
+        })
+        self.save_json(f'{key}.meta', manifest, force_file=True)
+
+    def catalog_base_hash(self, manifest: dict) -> Optional[str]:
+        # Hash of the JSON catalog. Manifests from before the journal have no
+        # base_hash, and no journal
+        return manifest.get('base_hash', manifest.get('content_hash'))
+
+    def load_catalog_journal(self, key: str,
+                             manifest: dict) -> Optional[List[Tuple[str, dict, List[str]]]]:
+        # The deltas appended to the JSON catalog, each with the content hash
+        # after it. Bytes past journal_size are from an append that did not
+        # reach the manifest. None if the deltas do not add up to the manifest
+        content_hash = self.catalog_base_hash(manifest)
+        size = manifest.get('journal_size', 0)
+        if content_hash is None:
+            return None
+        deltas = []
+        if size:
+            try:
+                with open(f'{key}.journal', 'rb') as f:
+                    journal = f.read(size)
+            except OSError as e:
+                self.debug_print_exception(e)
+                return None
+            if len(journal) != size:
+                return None
+            try:
+                for line in journal.splitlines():
+                    content_hash = hashlib.sha256(content_hash.encode() + line).hexdigest()
+                    delta = loads(line)
+                    deltas.append((content_hash, delta['updated'], delta['removed']))
+            except (ValueError, KeyError, TypeError) as e:
+                self.debug_print_exception(e)
+                return None
+        if content_hash != manifest.get('content_hash'):
+            return None
+        return deltas
+
+    def append_catalog_journal(self, key: str, manifest: dict, line: bytes) -> Tuple[str, int]:
+        size = manifest.get('journal_size', 0)
+        with open(f'{key}.journal', 'ab') as f:
+            f.truncate(size)
+            f.write(line + b'\n')
+        content_hash = hashlib.sha256(manifest['content_hash'].encode() + line).hexdigest()
+        return content_hash, size + len(line) + 1
+
+    def load_catalog_data(self, key: str, field: str, journal: Optional[bool] = True) -> dict:
+        # catalog['journal'] holds the deltas applied on top of the JSON
+        # catalog, or None when the next store has to write it whole
+        if self.isfile(key, force_file=True):
+            catalog = self.load_json(key, force_file=True)
+        else:
+            catalog = {'api': None, field: {}}
+        catalog[field] = CaseInsensitiveDict(catalog[field])
+        catalog['journal'] = None
+        if journal and catalog['api'] is not None:
+            deltas = self.load_catalog_journal(key, self.load_catalog_manifest(key))
+            for _, updated, removed in deltas or ():
+                for id in removed:
+                    catalog[field].pop(id)
+                catalog[field].update(updated)
+            catalog['journal'] = deltas
+        return catalog
+
+    def store_catalog(self, key: str, lang: Optional[str], field: str,
+                      catalog: dict, data: CaseInsensitiveDict, metadata: dict,
+                      fields: List[Tuple[str, ...]]) -> None:
+        old = catalog[field]
+        updated = {id: value for id, value in data.items() if old.get(id) != value}
+        removed = [id for id in old if id not in data]
+        added = len([id for id in updated if id not in old])
+        if self.config['loglevel'] == 'debug':
+            self.send(
+                f'{key}: {added} added, {len(updated) - added} changed, {len(removed)} removed',
+                color=yellow,
+                add_d=lambda x: f'{self.debug_message(x)}\n'
+            )
+        manifest = self.load_catalog_manifest(key)
+        if (not updated and not removed and catalog['api'] == self.config['api']
+                and manifest.get('content_hash') is not None):
+            self.store_catalog_manifest(key, lang, metadata)
+            return
+
+        # Small changes are appended to the journal, and the JSON catalog and
+        # its snapshot are left as they are. They are written whole again
+        # once the journal grows past a quarter of the catalog
+        if catalog.get('journal') is not None and catalog['api'] == self.config['api']:
+            line = dump_entry({'updated': updated, 'removed': removed}).encode('utf-8')
+            size = manifest.get('journal_size', 0) + len(line) + 1
+            if size <= os.path.getsize(f'{key}.json') // 4:
+                journal = self.append_catalog_journal(key, manifest, line)
+                self.store_catalog_manifest(key, lang, metadata, len(data), journal)
+                return
+
+        # The journal goes first, so that it is never applied to the new catalog
+        if os.path.isfile(f'{key}.journal'):
+            os.remove(f'{key}.journal')
+        self.save_json(
+            key,
+            {'api': self.config['api'], field: data},
+            force_file=True,
+            compact=True
+        )
+        self.store_catalog_manifest(key, lang, metadata, len(data))
+        self.store_catalog_snapshot(key, data, fields)
+
+    def catalog_snapshot(self, key: str, content_hash: str) -> str:
+        # Named after the content so that a new version never replaces a
+        # snapshot that is still mapped, which fails on Windows
+        return f'{key}.{content_hash[:16]}.snapshot'
+
+    def store_catalog_snapshot(self, key: str, data: dict,
+                               fields: List[Tuple[str, ...]]) -> None:
+        # Snapshots are made of the JSON catalog alone, the journal is
+        # applied over them when they are loaded
+        content_hash = self.catalog_base_hash(self.load_catalog_manifest(key))
+        if content_hash is None:
+            return
+        filename = self.catalog_snapshot(key, content_hash)
+        try:
+            write_snapshot(filename, data, fields, content_hash)
+        except OSError as e:
+            self.debug_print_exception(e)
+            return
+        for old in glob(f'{key}.*snapshot'):
+            if os.path.normpath(old) == os.path.normpath(filename):
+                continue
+            try:
+                os.remove(old)
+            except OSError as e:
+                # Still mapped on Windows, removed after a later update
+                self.debug_print_exception(e)
+
+    def open_catalog_snapshot(self, key: str, content_hash: str,
+                              factory: Optional[Callable[..., Any]]) -> Optional[SnapshotDict]:
+        filename = self.catalog_snapshot(key, content_hash)
+        if not os.path.isfile(filename):
+            return None
+        try:
+            data = SnapshotDict(filename, factory)
+        except (OSError, ValueError, KeyError, SnapshotError) as e:
+            self.debug_print_exception(e)
+            return None
+        if data.source_hash != content_hash:
+            return None
+        return data
+
+    def load_catalog(self, key: str, field: str, fields: List[Tuple[str, ...]],
+                     record: Optional[type] = None,
+                     write: Optional[bool] = True) -> Union[CaseInsensitiveDict, SnapshotDict]:
+        factory = record.from_fields if record is not None else None
+        convert = record.from_dict if record is not None else None
+        manifest = self.load_catalog_manifest(key)
+        content_hash = self.catalog_base_hash(manifest)
+        if content_hash is not None:
+            # A broken journal is left out, and replaced by the next store
+            deltas = self.load_catalog_journal(key, manifest) or []
+            snapshot = self.open_catalog_snapshot(key, content_hash, factory)
+            if snapshot is None and write:
+                data = self.load_catalog_data(key, field, journal=False)[field]
+                self.store_catalog_snapshot(key, data, fields)
+                # The write may have failed, then the JSON catalog is used
+                snapshot = self.open_catalog_snapshot(key, content_hash, factory)
+            if snapshot is not None:
+                return snapshot.apply(deltas, convert) if deltas else snapshot
+        data = self.load_catalog_data(key, field)[field]
+        if record is not None:
+            data = CaseInsensitiveDict({
+                id: record.from_dict(value)
+                for id, value in data.items()
+            })
+        return data
+
+    def is_catalog_outdated(self, key: str, td: datetime.timedelta) -> bool:
+        manifest = self.load_catalog_manifest(key)
+        if manifest.get('api') != self.config['api'] or 'checked_at' not in manifest:
+            return True
+        checked_at = datetime.datetime.fromisoformat(manifest['checked_at'])
+        return checked_at < (datetime.datetime.utcnow() - td)
+
+    async def get_item_data(self, lang: str,
+                            metadata: Optional[dict] = None) -> Tuple[Optional[list], dict]:
+        convert = partial(self.format_kept_item, mode=self.config['api'])
         if self.config['api'] == 'BenBot':
-            return self.format_items(await self.http.get(
+            data, metadata = await self.http.get_conditional(
                 'http://benbotfn.tk/api/v1/cosmetics/br',
+                metadata,
+                (),
+                convert,
                 params={'lang': lang}
-            ), self.config['api'])
+            )
         elif self.config['api'] == 'Fortnite-API':
-            return self.format_items((await self.http.get(
+            data, metadata = await self.http.get_conditional(
                 'https://fortnite-api.com/v2/cosmetics/br',
+                metadata,
+                ('data',),
+                convert,
                 params={'language': lang}
-            ))['data'], self.config['api'])
+            )
         elif self.config['api'] == 'FortniteApi.io':
-            items = (await self.http.get(
+            data, metadata = await self.http.get_conditional(
                 'https://fortniteapi.io/v1/items/list',
+                metadata,
+                ('items', lambda x: x not in [
+                    'bannertoken',
+                    'bundle',
+                    'cosmeticvariant'
+                ]),
+                convert,
                 params={'lang': lang},
                 headers={'Authorization': self.config['api_key']}
-            ))['items']
-            return self.format_items(
-                sum(
-                    [v for k, v in items.items() if k not in [
-                        'bannertoken',
-                        'bundle',
-                        'cosmeticvariant'
-                    ]],
-                    []
-                ),
-                self.config['api']
             )
+        if data is not None:
+            data.sort(key=lambda x: x['id'])
+        return data, metadata
+
+    async def store_item_data(self, lang: str, timeout: Optional[float] = None) -> None:
+        key = f'{self.item_dir}/items_{lang}'
+        data, metadata = await asyncio.wait_for(
+            self.get_item_data(lang, self.load_catalog_manifest(key).get('http')),
+            timeout
+        )
+        if data is None:
+            self.store_catalog_manifest(key, lang, metadata)
+            return
+        # Parsing, merging and writing the catalog stays off the loop
+        await self.loop.run_in_executor(
+            None,
+            self.merge_item_data,
+            key,
+            lang,
+            data,
+            metadata
+        )
 
-    async def store_item_data(self, lang: str) -> None:
-        if self.isfile(f'{self.item_dir}/items_{lang}', force_file=True):
-            items = self.load_json(f'{self.item_dir}/items_{lang}', force_file=True)
-            items['items'] = CaseInsensitiveDict(items['items'])
-        else:
-            items = {'api': None, 'items': CaseInsensitiveDict()}
-        data = await self.get_item_data(lang)
+    def merge_item_data(self, key: str, lang: str, data: list, metadata: dict) -> None:
+        catalog = self.load_catalog_data(key, 'items')
+        items = CaseInsensitiveDict(catalog['items'])
         if self.config['api'] == 'FortniteApi.io':
             for item in data:
-                i = items['items'].get(item['id'])
+                i = items.get(item['id'])
                 if i is None:
-                    items['items'][item['id']] = item
+                    items[item['id']] = item
                 elif i['variants'] is not None:
                     item['variants'] = i['variants']
-                    items['items'][item['id']] = item
+                    items[item['id']] = item
         else:
             for item in data:
-                items['items'][item['id']] = item
-        items['api'] = self.config['api']
-        self.save_json(
-            f'{self.item_dir}/items_{lang}',
-            items,
-            force_file=True,
-            compact=True
-        )
+                items[item['id']] = item
+        self.store_catalog(key, lang, 'items', catalog, items, metadata, ITEM_FIELDS)
 
-    async def get_new_item_data(self, lang: str) -> list:
+    async def get_new_item_data(self, lang: str,
+                                metadata: Optional[dict] = None) -> Tuple[Optional[list], dict]:
+        convert = partial(self.format_kept_item, mode=self.config['api'])
         if self.config['api'] == 'BenBot':
-            return self.format_items(await self.http.get(
+            data, metadata = await self.http.get_conditional(
                 'http://benbotfn.tk/api/v1/newCosmetics',
+                metadata,
+                (),
+                convert,
                 params={'lang': lang}
-            ), self.config['api'])
+            )
         elif self.config['api'] == 'Fortnite-API':
-            return self.format_items((await self.http.get(
+            data, metadata = await self.http.get_conditional(
                 'https://fortnite-api.com/v2/cosmetics/br/new',
+                metadata,
+                ('data', 'items'),
+                convert,
                 params={'language': lang}
-            ))['data']['items'], self.config['api'])
+            )
         elif self.config['api'] == 'FortniteApi.io':
-            return self.format_items((await self.http.get(
+            data, metadata = await self.http.get_conditional(
                 'https://fortniteapi.io/v1/items/upcoming',
+                metadata,
+                ('items',),
+                convert,
                 params={'lang': lang},
                 headers={'Authorization': self.config['api_key']}
-            ))['items'], self.config['api'])
+            )
+        if data is not None:
+            data.sort(key=lambda x: x['id'])
+        return data, metadata
+
+    async def store_new_item_data(self, lang: str, timeout: Optional[float] = None) -> None:
+        key = f'{self.item_dir}/new_items_{lang}'
+        data, metadata = await asyncio.wait_for(
+            self.get_new_item_data(lang, self.load_catalog_manifest(key).get('http')),
+            timeout
+        )
+        if data is None:
+            self.store_catalog_manifest(key, lang, metadata)
+            return
+        await self.loop.run_in_executor(
+            None,
+            self.merge_new_item_data,
+            key,
+            lang,
+            data,
+            metadata
+        )
 
-    async def store_new_item_data(self, lang: str) -> None:
-        if self.isfile(f'{self.item_dir}/new_items_{lang}', force_file=True):
-            items = self.load_json(f'{self.item_dir}/new_items_{lang}', force_file=True)
-            items['items'] = CaseInsensitiveDict(items['items'])
-        else:
-            items = {'api': None, 'items': CaseInsensitiveDict()}
-        data = {i['id']: i for i in await self.get_new_item_data(lang)}
+    def merge_new_item_data(self, key: str, lang: str, data: list, metadata: dict) -> None:
+        catalog = self.load_catalog_data(key, 'items')
+        data = CaseInsensitiveDict({i['id']: i for i in data})
         if self.config['api'] == 'FortniteApi.io':
-            for item in items['items'].values():
+            for item in catalog['items'].values():
                 i = data.get(item['id'])
                 if i is None:
                     continue
                 if item['variants'] is not None:
-                    data[item['id']]['variants'] = item['variants']
-        items['api'] = self.config['api']
-        self.save_json(
-            f'{self.item_dir}/new_items_{lang}',
-            {'api': self.config['api'], 'items': data},
-            force_file=True,
-            compact=True
-        )
+                    i['variants'] = item['variants']
+        self.store_catalog(key, lang, 'items', catalog, data, metadata, ITEM_FIELDS)
 
 
     def format_playlist(self, data: dict, mode: str) -> dict:
@@ -1544,79 +1756,108 @@ class Bot:
             for playlist in sorted(data, key=lambda x: x['id'])
         ]
 
-    async def get_playlists_data(self, lang: str) -> list:
+    async def get_playlists_data(self, lang: str,
+                                 metadata: Optional[dict] = None) -> Tuple[Optional[list], dict]:
         if self.config['api'] == 'BenBot':
-            return []
+            return [], {}
         elif self.config['api'] == 'Fortnite-API':
-            return self.format_playlists(
-                (await self.http.get(
-                    'https://fortnite-api.com/v1/playlists',
-                    params={'lang': lang}
-                ))['data'], self.config['api']
+            data, metadata = await self.http.get_conditional(
+                'https://fortnite-api.com/v1/playlists',
+                metadata,
+                params={'lang': lang}
             )
+            if data is not None:
+                data = self.format_playlists(data['data'], self.config['api'])
         elif self.config['api'] == 'FortniteApi.io':
-            return self.format_playlists(
-                (await self.http.get(
-                    'https://fortniteapi.io/v1/game/modes',
-                    params={'lang': lang},
-                    headers={'Authorization': self.config['api_key']}
-                ))['modes'], self.config['api']
+            data, metadata = await self.http.get_conditional(
+                'https://fortniteapi.io/v1/game/modes',
+                metadata,
+                params={'lang': lang},
+                headers={'Authorization': self.config['api_key']}
             )
+            if data is not None:
+                data = self.format_playlists(data['modes'], self.config['api'])
+        return data, metadata
+
+    async def store_playlists_data(self, lang: str, timeout: Optional[float] = None) -> None:
+        key = f'{self.item_dir}/playlists_{lang}'
+        data, metadata = await asyncio.wait_for(
+            self.get_playlists_data(lang, self.load_catalog_manifest(key).get('http')),
+            timeout
+        )
+        if data is None:
+            self.store_catalog_manifest(key, lang, metadata)
+            return
+        await self.loop.run_in_executor(
+            None,
+            self.merge_playlists_data,
+            key,
+            lang,
+            data,
+            metadata
+        )
 
-    async def store_playlists_data(self, lang: str) -> None:
-        if self.isfile(f'{self.item_dir}/playlists_{lang}', force_file=True):
-            playlists = self.load_json(f'{self.item_dir}/playlists_{lang}', force_file=True)
-            playlists['playlists'] = CaseInsensitiveDict(playlists['playlists'])
-        else:
-            playlists = {'api': None, 'playlists': CaseInsensitiveDict()}
-        data = await self.get_playlists_data(lang)
+    def merge_playlists_data(self, key: str, lang: str, data: list, metadata: dict) -> None:
+        catalog = self.load_catalog_data(key, 'playlists')
+        playlists = CaseInsensitiveDict(catalog['playlists'])
         for playlist in data:
-            playlists['playlists'][playlist['id']] = playlist
-        playlists['api'] = self.config['api']
-        self.save_json(
-            f'{self.item_dir}/playlists_{lang}',
-            playlists,
-            force_file=True,
-            compact=True
-        )
+            playlists[playlist['id']] = playlist
+        self.store_catalog(key, lang, 'playlists', catalog, playlists, metadata, PLAYLIST_FIELDS)
 
 
-    async def get_banner_data(self) -> dict:
+    async def get_banner_data(self, metadata: Optional[dict] = None) -> Tuple[Optional[dict], dict]:
         if self.config['api'] == 'BenBot':
-            data = await self.http.get(
+            data, metadata = await self.http.get_conditional(
                 'https://benbotfn.tk/api/v1/files/search',
+                metadata,
                 params={
                     'matchMethod': 'starts',
                     'path': 'FortniteGame/Content/Items/BannerIcons/'
                 }
             )
-            url = 'https://benbotfn.tk/api/v1/exportAsset?path={}&rawIcon=true'
-            return {
-                'api': self.config['api'],
-                'banners': {banner[39:-7]: url.format(banner) for banner in data}
-            }
+            if data is not None:
+                url = 'https://benbotfn.tk/api/v1/exportAsset?path={}&rawIcon=true'
+                data = {
+                    'api': self.config['api'],
+                    'banners': {banner[39:-7]: url.format(banner) for banner in data}
+                }
         elif self.config['api'] == 'Fortnite-API':
-            data = (await self.http.get(
-                'https://fortnite-api.com/v1/banners'
-            ))['data']
-            return {
-                'api': self.config['api'],
-                'banners': {banner['id']: banner['images']['icon'] for banner in data}
-            }
+            data, metadata = await self.http.get_conditional(
+                'https://fortnite-api.com/v1/banners',
+                metadata
+            )
+            if data is not None:
+                data = {
+                    'api': self.config['api'],
+                    'banners': {banner['id']: banner['images']['icon'] for banner in data['data']}
+                }
         elif self.config['api'] == 'FortniteApi.io':
-            return {'api': self.config['api'], 'banners': {}}
+            return {'api': self.config['api'], 'banners': {}}, {}
+        return data, metadata
+
+    async def store_banner_data(self, timeout: Optional[float] = None) -> None:
+        key = f'{self.item_dir}/banners'
+        data, metadata = await asyncio.wait_for(
+            self.get_banner_data(self.load_catalog_manifest(key).get('http')),
+            timeout
+        )
+        if data is None:
+            self.store_catalog_manifest(key, None, metadata)
+            return
+        await self.loop.run_in_executor(
+            None,
+            self.merge_banner_data,
+            key,
+            data,
+            metadata
+        )
 
-    async def store_banner_data(self) -> None:
-        if self.isfile(f'{self.item_dir}/banners', force_file=True):
-            banners = self.load_json(f'{self.item_dir}/banners', force_file=True)
-            banners['banners'] = CaseInsensitiveDict(banners['banners'])
-        else:
-            banners = {'api': None, 'banners': CaseInsensitiveDict()}
-        data = await self.get_banner_data()
-        for id, image in data.items():
-            banners['banners'][id] = image
-        banners['api'] = self.config['api']
-        self.save_json(f'{self.item_dir}/banners', banners, force_file=True, compact=True)
+    def merge_banner_data(self, key: str, data: dict, metadata: dict) -> None:
+        catalog = self.load_catalog_data(key, 'banners')
+        banners = CaseInsensitiveDict(catalog['banners'])
+        for id, image in data['banners'].items():
+            banners[id] = image
+        self.store_catalog(key, None, 'banners', catalog, banners, metadata, BANNER_FIELDS)
 
 
     async def error_callback(self, client: Client, e: Exception):
@@ -1632,9 +1873,8 @@ class Bot:
                     add_p=self.time,
                     file=sys.stderr
                 )
-                details = self.get_device_auth_details()
-                details.pop(client.config['fortnite']['email'])
-                self.save_json('device_auths', details)
+                self.get_device_auth_details()
+                self.store.remove_entry('device_auths', client.config['fortnite']['email'].lower())
             else:
                 self.print_exception(e)
                 self.send(
@@ -1667,181 +1907,200 @@ class Bot:
                 add_p=self.time
             )
 
-    async def update_data(self) -> None:
-        # Cosmetics
-        tasks = []
-        if self.isfile(f"{self.item_dir}/items_{self.config['search_lang']}", force_file=True):
-            items = self.load_json(f"{self.item_dir}/items_{self.config['search_lang']}", force_file=True)
-            if items['api'] != self.config['api']:
-                flag = True
-            else:
-                flag = self.is_not_edited_for(
-                    f"{self.item_dir}/items_{self.config['search_lang']}",
-                    datetime.timedelta(hours=2),
-                    force_file=True
-                )
-        else:
-            flag = True
-        if flag:
-            tasks.append(self.loop.create_task(self.store_item_data(self.config['search_lang'])))
-
-        if self.isfile(f"{self.item_dir}/items_{self.config['sub_search_lang']}", force_file=True):
-            items = self.load_json(f"{self.item_dir}/items_{self.config['sub_search_lang']}", force_file=True)
-            if items['api'] != self.config['api']:
-                flag = True
-            else:
-                flag = self.is_not_edited_for(
-                    f"{self.item_dir}/items_{self.config['sub_search_lang']}",
-                    datetime.timedelta(hours=2),
-                    force_file=True
-                )
-        else:
-            flag = True
-        if flag:
-            tasks.append(self.loop.create_task(self.store_item_data(self.config['sub_search_lang'])))
-
-        exception = False
-        if tasks:
-            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
-            for p in pending:
-                if not p.done():
-                    p.cancel()
-            for d in done:
-                if d.exception() is not None:
-                    exception = True
-                    self.print_exception(d.exception())
-            if exception:
-                self.send(
-                    self.l(
-                        'get_item_failed'
-                    ),
-                    file=sys.stderr
-                )
-                for lang in (self.config['search_lang'], self.config['sub_search_lang']):
-                    if not self.isfile(f'{self.item_dir}/items_{lang}', force_file=True):
-                        sys.exit(1)
-
-        # New cosmetics
-        tasks = []
-        if self.isfile(f"{self.item_dir}/new_items_{self.config['search_lang']}", force_file=True):
-            items = self.load_json(f"{self.item_dir}/new_items_{self.config['search_lang']}", force_file=True)
-            if items['api'] != self.config['api']:
-                flag = True
-            else:
-                flag = self.is_not_edited_for(
-                    f"{self.item_dir}/new_items_{self.config['search_lang']}",
-                    datetime.timedelta(hours=2),
-                    force_file=True
-                )
-        else:
-            flag = True
-        if flag:
+    async def refresh_catalog(self, semaphore: asyncio.Semaphore, timeout: Optional[float],
+                              func: Callable[..., Awaitable[None]],
+                              *args: Any) -> Tuple[Optional[Exception], float]:
+        # Only the fetch is timed out. Cancelling the merge would leave its
+        # thread writing the catalog while it is reported as failed
+        async with semaphore:
+            start = time.perf_counter()
             try:
-                await self.store_new_item_data(self.config['search_lang'])
+                await func(*args, timeout=timeout)
             except Exception as e:
-                self.print_exception(e)
-                self.send(
-                    self.l(
-                        'get_item_failed'
-                    ),
-                    file=sys.stderr
-                )
+                return e, time.perf_counter() - start
+            return None, time.perf_counter() - start
+
+    async def update_data(self, td: Optional[datetime.timedelta] = None) -> None:
+        td = td or datetime.timedelta(hours=2)
+        langs = [self.config['search_lang']]
+        if self.config['sub_search_lang'] != self.config['search_lang']:
+            langs.append(self.config['sub_search_lang'])
+
+        # (key, store function, args, failure message, required)
+        jobs = []
+        for lang in langs:
+            jobs.append((
+                f'{self.item_dir}/items_{lang}',
+                self.store_item_data, (lang,),
+                'get_item_failed', True
+            ))
+        jobs.append((
+            f"{self.item_dir}/new_items_{self.config['search_lang']}",
+            self.store_new_item_data, (self.config['search_lang'],),
+            'get_item_failed', False
+        ))
+        for lang in langs:
+            jobs.append((
+                f'{self.item_dir}/playlists_{lang}',
+                self.store_playlists_data, (lang,),
+                'get_playlist_failed', True
+            ))
+        jobs.append((
+            f'{self.item_dir}/banners',
+            self.store_banner_data, (),
+            'get_banner_failed', False
+        ))
+        jobs = [
+            job for job in jobs
+            if self.is_catalog_outdated(job[0], td)
+        ]
+        if not jobs:
+            return
 
-        # Playlists
-        tasks = []
-        if self.isfile(f"{self.item_dir}/playlists_{self.config['search_lang']}", force_file=True):
-            playlists = self.load_json(f"{self.item_dir}/playlists_{self.config['search_lang']}", force_file=True)
-            if playlists['api'] != self.config['api']:
-                flag = True
-            else:
-                flag = self.is_not_edited_for(
-                    f"{self.item_dir}/playlists_{self.config['search_lang']}",
-                    datetime.timedelta(hours=2),
-                    force_file=True
-                )
-        else:
-            flag = True
-        if flag:
-            tasks.append(self.loop.create_task(self.store_playlists_data(self.config['search_lang'])))
-
-        if self.isfile(f"{self.item_dir}/playlists_{self.config['sub_search_lang']}", force_file=True):
-            playlists = self.load_json(f"{self.item_dir}/playlists_{self.config['sub_search_lang']}", force_file=True)
-            if playlists['api'] != self.config['api']:
-                flag = True
-            else:
-                flag = self.is_not_edited_for(
-                    f"{self.item_dir}/playlists_{self.config['sub_search_lang']}",
-                    datetime.timedelta(hours=2),
-                    force_file=True
-                )
-        else:
-            flag = True
-        if flag:
-            tasks.append(self.loop.create_task(self.store_playlists_data(self.config['sub_search_lang'])))
-
-        exception = False
-        if tasks:
-            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
-            for p in pending:
-                if not p.done():
-                    p.cancel()
-            for d in done:
-                if d.exception() is not None:
-                    exception = True
-                    self.print_exception(d.exception())
-            if exception:
+        semaphore = asyncio.Semaphore(self.config['refresh_concurrency'])
+        start = time.perf_counter()
+        # A first download has nothing to fall back on, so it is not timed out
+        results = await asyncio.gather(*[
+            self.refresh_catalog(
+                semaphore,
+                (self.config['refresh_timeout']
+                 if self.isfile(key, force_file=True) else None),
+                func,
+                *args
+            )
+            for key, func, args, _, _ in jobs
+        ])
+        elapsed = time.perf_counter() - start
+
+        messages = []
+        exit_ = False
+        for (key, _, _, message, required), (exception, took) in zip(jobs, results):
+            if self.config['loglevel'] == 'debug':
                 self.send(
-                    self.l(
-                        'get_playlist_failed'
-                    ),
-                    file=sys.stderr
+                    f'{key}: {took:.2f}s{" (failed)" if exception is not None else ""}',
+                    color=yellow,
+                    add_d=lambda x: f'{self.debug_message(x)}\n'
                 )
-                for lang in (self.config['search_lang'], self.config['sub_search_lang']):
-                    if not self.isfile(f'{self.item_dir}/playlists_{lang}', force_file=True):
-                        sys.exit(1)
-
-        # Banner
-        if not exception:
-            if self.isfile(f'{self.item_dir}/banners', force_file=True):
-                banners = self.load_json(f"{self.item_dir}/banners", force_file=True)
-                if banners['api'] != self.config['api']:
-                    flag = True
-                else:
-                    flag = self.is_not_edited_for(
-                        f'{self.item_dir}/banners',
-                        datetime.timedelta(hours=2),
-                        force_file=True
-                    )
-            else:
-                flag = True
-            if flag:
-                await self.store_banner_data()
+            if exception is None:
+                continue
+            self.print_exception(exception)
+            if message not in messages:
+                messages.append(message)
+            if required and not self.isfile(key, force_file=True):
+                exit_ = True
+        if self.config['loglevel'] == 'debug':
+            self.send(
+                f'refresh: {elapsed:.2f}s',
+                color=yellow,
+                add_d=lambda x: f'{self.debug_message(x)}\n'
+            )
+
+        for message in messages:
+            self.send(
+                self.l(
+                    message
+                ),
+                file=sys.stderr
+            )
+        if exit_:
+            sys.exit(1)
+
+    def catalog_hashes(self) -> List[Optional[str]]:
+        return [
+            self.load_catalog_manifest(key).get('content_hash')
+            for key in (
+                f'{self.item_dir}/items_{self.config["search_lang"]}',
+                f'{self.item_dir}/items_{self.config["sub_search_lang"]}',
+                f'{self.item_dir}/new_items_{self.config["search_lang"]}',
+                f'{self.item_dir}/playlists_{self.config["search_lang"]}',
+                f'{self.item_dir}/playlists_{self.config["sub_search_lang"]}',
+                f'{self.item_dir}/banners'
+            )
+        ]
+
+    def read_data(self) -> Tuple[Union[CaseInsensitiveDict, SnapshotDict], ...]:
+        return (
+            self.load_catalog(
+                f'{self.item_dir}/items_{self.config["search_lang"]}',
+                'items',
+                ITEM_FIELDS,
+                Cosmetic
+            ),
+            self.load_catalog(
+                f'{self.item_dir}/new_items_{self.config["search_lang"]}',
+                'items',
+                ITEM_FIELDS,
+                Cosmetic
+            ),
+            self.load_catalog(
+                f'{self.item_dir}/playlists_{self.config["search_lang"]}',
+                'playlists',
+                PLAYLIST_FIELDS,
+                Playlist
+            ),
+            self.load_catalog(
+                f'{self.item_dir}/banners',
+                'banners',
+                BANNER_FIELDS
+            )
+        )
+
+    def read_sub_data(self) -> Tuple[Union[CaseInsensitiveDict, SnapshotDict], ...]:
+        # Called by the index on the first fallback to the sub language, from
+        # a searcher thread. It must not write the snapshots that a refresh
+        # may be writing at the same time
+        if self.config['sub_search_lang'] == self.config['search_lang']:
+            return CaseInsensitiveDict(), CaseInsensitiveDict()
+        return (
+            self.load_catalog(
+                f'{self.item_dir}/items_{self.config["sub_search_lang"]}',
+                'items',
+                ITEM_FIELDS,
+                Cosmetic,
+                write=False
+            ),
+            self.load_catalog(
+                f'{self.item_dir}/playlists_{self.config["sub_search_lang"]}',
+                'playlists',
+                PLAYLIST_FIELDS,
+                Playlist,
+                write=False
+            )
+        )
+
+    def swap_data(self, data: Tuple[Union[CaseInsensitiveDict, SnapshotDict], ...],
+                  views: Optional[dict] = None) -> None:
+        # Must not await anything, so that no command sees half swapped data
+        self.main_items, self.new_items, self.main_playlists, self.banners = data
+        self.index.load(
+            self.main_items,
+            self.main_playlists,
+            views=views
+        )
 
     def load_data(self) -> None:
-        self.main_items = CaseInsensitiveDict(self.load_json(
-            f'{self.item_dir}/items_{self.config["search_lang"]}',
-            force_file=True
-        )['items'])
-        self.sub_items = CaseInsensitiveDict(self.load_json(
-            f'{self.item_dir}/items_{self.config["sub_search_lang"]}',
-            force_file=True
-        )['items'])
-        self.new_items = CaseInsensitiveDict(self.load_json(
-            f'{self.item_dir}/new_items_{self.config["search_lang"]}',
-            force_file=True
-        )['items'])
-        self.main_playlists = CaseInsensitiveDict(self.load_json(
-            f'{self.item_dir}/playlists_{self.config["search_lang"]}',
-            force_file=True
-        )['playlists'])
-        self.sub_playlists = CaseInsensitiveDict(self.load_json(
-            f'{self.item_dir}/playlists_{self.config["sub_search_lang"]}',
-            force_file=True
-        )['playlists'])
-        self.banners = CaseInsensitiveDict(self.load_json(
-            f'{self.item_dir}/banners',
-            force_file=True
-        )['banners'])
+        self.swap_data(self.read_data())
+
+    async def refresh_data(self) -> None:
+        td = datetime.timedelta(minutes=self.config['refresh_interval'])
+        hashes = self.catalog_hashes()
+        await self.update_data(td)
+        if self.catalog_hashes() == hashes:
+            return
+        data = await self.index.run(self.read_data)
+        views = await self.index.build_views(data[0], data[2])
+        self.swap_data(data, views)
+
+    async def refresh_data_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.config['refresh_interval'] * 60)
+            # Drop the sub language catalogs if nothing fell back to them
+            # during the last interval
+            self.index.evict_sub(self.config['refresh_interval'] * 60)
+            try:
+                await self.refresh_data()
+            except Exception as e:
+                self.print_exception(e)
 
     def fix_config(self, config: dict) -> None:
         config['fortnite']['party']['privacy'] = getattr(
@@ -2001,12 +2260,17 @@ class Bot:
         os.execv(sys.executable, ['python', f'"{os.path.abspath(sys.argv[0])}"', *sys.argv[1:]])
 
     async def close(self) -> None:
+        if self.refresher is not None:
+            self.refresher.cancel()
+
         if self.server is not None:
             await self.server.close()
 
         await fortnitepy.close_multiple(
             self.clients
         )
+        await self.store.close()
+        self.storage.close()
 
     async def start(self) -> None:
         self.send(
@@ -2058,13 +2322,13 @@ class Bot:
             await self.update_data()
             self.load_data()
             self.searcher = Searcher(
-                self.main_items,
-                self.sub_items,
-                self.main_playlists,
-                self.sub_playlists,
+                self.index,
                 True,
                 False
             )
+            await self.searcher.prepare()
+            if self.config['refresh_interval']:
+                self.refresher = self.loop.create_task(self.refresh_data_loop())
             self.send(
                 self.l(
                     'booting',
@@ -2205,7 +2469,10 @@ class Bot:
             if self.discord_client is not None:
                 tasks.append(self.discord_client.start())
 
-            await asyncio.gather(*tasks)
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                await self.store.close()
         else:
             while True:
                 await asyncio.sleep(0.1)
@@ -13,7 +13,6 @@ from typing import (TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple,
 import aioxmpp
 import discord
 import fortnitepy
-import jaconv
 
 from .colors import blue, green, magenta, yellow
 from .commands import Command, FindUserMatchMethod, FindUserMode, MyMessage
@@ -402,10 +401,7 @@ class Client(fortnitepy.Client):
         self.localize = self.bot.localize
         self.all_commands = self.bot.all_commands
         self.searcher = Searcher(
-            self.bot.main_items,
-            self.bot.sub_items,
-            self.bot.main_playlists,
-            self.bot.sub_playlists,
+            self.bot.index,
             self.config['case_insensitive'],
             self.config['convert_kanji']
         )
@@ -1727,6 +1723,13 @@ class Client(fortnitepy.Client):
             else:
                 return '{0.nickname}({0.display_name}) / {0.id}{1}'.format(user, append)
 
+    def normalize(self, text: str) -> str:
+        return self.bot.normalizer.normalize(
+            text,
+            self.config['case_insensitive'],
+            self.config['convert_kanji']
+        )
+
     def name_cosmetic(self, item: dict) -> str:
         if self.config['loglevel'] == 'normal':
             return item['name']
@@ -1789,10 +1792,7 @@ class Client(fortnitepy.Client):
             )
             name_users += [u for u in id_users if u not in name_users]
             return name_users
-        if self.config['case_insensitive']:
-            user = jaconv.kata2hira(user.casefold())
-        if self.config['convert_kanji']:
-            user = self.bot.converter.do(user)
+        user = self.normalize(user)
 
         if users is None:
             users = self._caches.values()
@@ -1800,11 +1800,7 @@ class Client(fortnitepy.Client):
         for u in users:
             if self.get_as_user(u) in _users:
                 continue
-            user_name = u.display_name
-            if self.config['case_insensitive']:
-                user_name = jaconv.kata2hira(user_name.casefold())
-            if self.config['convert_kanji']:
-                user_name = self.bot.converter.do(user_name)
+            user_name = self.normalize(u.display_name)
 
             if method is FindUserMatchMethod.FULL:
                 if mode is FindUserMode.DISPLAY_NAME:
@@ -3134,19 +3130,14 @@ class Client(fortnitepy.Client):
         if not message.args:
             return
         message.prev = self.prev.get(message.author.id)
-        arg = message.args[0]
-        if self.config['case_insensitive']:
-            arg = jaconv.kata2hira(arg.lower())
-        if self.config['convert_kanji']:
-            arg = self.bot.converter.do(arg)
+        arg = self.normalize(message.args[0])
         executed = False
         for command in self.all_commands.values():
             try:
-                words = self.commands['commands'][command.name]
-                if self.config['case_insensitive']:
-                    words = [jaconv.kata2hira(word.lower()) for word in words]
-                if self.config['convert_kanji']:
-                    words = [self.bot.converter.do(word) for word in words]
+                words = [
+                    self.normalize(word)
+                    for word in self.commands['commands'][command.name]
+                ]
                 if arg in words:
                     self.loop.create_task(self.call_command(command, message))
                     executed = True
@@ -3231,7 +3222,7 @@ class Client(fortnitepy.Client):
                     )
                 )
 
-            cosmetics = self.searcher.search_item_name_id(message.content)
+            cosmetics = await self.searcher.asearch_item_name_id(message.content)
 
             if len(cosmetics) > self.config['search_max']:
                 await message.reply(
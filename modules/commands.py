@@ -321,10 +321,7 @@ async def all_cosmetics(item: str, client: 'Client', message: MyMessage) -> None
         return
 
     async def all_cosmetics():
-        cosmetics = [
-            i for i in client.bot.main_items.values()
-            if i['type']['backendValue'] == item
-        ]
+        cosmetics = await client.searcher.aget_items(item)
         for cosmetic in cosmetics:
             if getattr(client, attr)(message.author.id):
                 await message.reply(
@@ -375,11 +372,26 @@ async def cosmetic_search(item: Optional[str], mode: str, command: Command,
             )
         )
 
-    cosmetics = client.searcher.search_item(mode, ' '.join(message.args[1:]), item)
+    if mode == 'name':
+        # One more than search_max tells that there are too many
+        cosmetics = await client.searcher.asearch_item_ranked(
+            ' '.join(message.args[1:]),
+            item,
+            limit=client.config['search_max'] + 1
+        )
+    else:
+        cosmetics = await client.searcher.asearch_item(mode, ' '.join(message.args[1:]), item)
 
     if len(cosmetics) > client.config['search_max']:
+        if mode == 'name':
+            count = await client.searcher.acount_item_ranked(
+                ' '.join(message.args[1:]),
+                item
+            )
+        else:
+            count = len(cosmetics)
         await message.reply(
-            client.l('too_many', client.l('item'), len(cosmetics))
+            client.l('too_many', client.l('item'), count)
         )
         return
 
@@ -438,7 +450,7 @@ async def playlist_search(mode: str, command: Command,
             )
         )
 
-    playlists = client.searcher.search_playlist(
+    playlists = await client.searcher.asearch_playlist(
         mode,
         ' '.join(message.args[1:])
     )
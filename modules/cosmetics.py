@@ -1,135 +1,971 @@
 # -*- coding: utf-8 -*-
-from typing import Optional, List
-
-import jaconv
-from pykakasi import kakasi
+import asyncio
+import bisect
+import copy
+import heapq
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .normalizer import Normalizer
+from .snapshot import SnapshotDict
 
 
 class CaseInsensitiveDict(dict):
+    # Keys are stored casefolded. Lookups go through the dict methods directly
+    # instead of super(), which is most of the cost of a lookup
     def __init__(self, v=None, **kwarg):
         super().__init__(self.casefold(v, **kwarg))
 
+    @staticmethod
+    def fold(k):
+        if isinstance(k, str):
+            return k.casefold()
+        return k
+
+    @staticmethod
+    def is_folded(keys):
+        # casefold works per character, so one pass over the joined keys
+        # tells whether every key is already folded. The first key alone
+        # usually tells a source that was never folded
+        first = next(iter(keys), '')
+        if isinstance(first, str) and first.casefold() != first:
+            return False
+        try:
+            text = '\0'.join(keys)
+        except TypeError:
+            return False
+        return text.casefold() == text
+
     def casefold(self, v, **kwarg):
-        data = {}
-        if v is not None:
-            if isinstance(v, dict):
-                for k, v in v.items():
-                    if isinstance(k, str):
-                        k = k.casefold()
-                    data[k] = v
+        if v is None:
+            data = {}
+        elif isinstance(v, CaseInsensitiveDict):
+            data = v
+        elif isinstance(v, dict):
+            if self.is_folded(v):
+                data = v
             else:
-                for k, v in v:
-                    if isinstance(k, str):
-                        k = k.casefold()
-                    data[k] = v
-        for k, v in kwarg.items():
-            if isinstance(k, str):
-                k = k.casefold()
-            data[k] = v
+                data = {
+                    k.casefold() if isinstance(k, str) else k: value
+                    for k, value in v.items()
+                }
+        else:
+            data = {k.casefold() if isinstance(k, str) else k: value for k, value in v}
+        if kwarg:
+            data = dict(data)
+            data.update({self.fold(k): value for k, value in kwarg.items()})
         return data
 
     def __contains__(self, k):
-        if isinstance(k, str):
-            k = k.casefold()
-        return super().__contains__(k)
+        return dict.__contains__(self, self.fold(k))
 
     def __delitem__(self, k):
-        if isinstance(k, str):
-            k = k.casefold()
-        return super().__delitem__(k)
+        dict.__delitem__(self, self.fold(k))
 
     def __getitem__(self, k):
-        if isinstance(k, str):
-            k = k.casefold()
-        return super().__getitem__(k)
+        return dict.__getitem__(self, self.fold(k))
 
     def get(self, k, default=None):
-        if isinstance(k, str):
-            k = k.casefold()
-        return super().get(k, default)
+        return dict.get(self, self.fold(k), default)
 
     def pop(self, k, default=None):
-        if isinstance(k, str):
-            k = k.casefold()
-        return super().pop(k, default)
+        return dict.pop(self, self.fold(k), default)
+
+    def setdefault(self, k, default=None):
+        return dict.setdefault(self, self.fold(k), default)
 
     def update(self, v=None, **kwarg):
-        super().update(self.casefold(v, **kwarg))
+        dict.update(self, self.casefold(v, **kwarg))
 
     def __setitem__(self, k, v):
-        if isinstance(k, str):
-            k = k.casefold()
-        super().__setitem__(k, v)
+        dict.__setitem__(self, self.fold(k), v)
+
+
+class NgramIndex:
+    NGRAM = 3
+    CJK_NGRAM = 2
+    CJK_PATTERN = re.compile(
+        '[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff66-\uff9f]'
+    )
+
+    def __init__(self, column: List[Optional[str]]) -> None:
+        self.postings = {}
+        self.cjk_postings = {}
+        for num, value in enumerate(column):
+            if value is None:
+                continue
+            self.add(self.postings, num, value, self.NGRAM)
+            if self.CJK_PATTERN.search(value) is not None:
+                self.add(self.cjk_postings, num, value, self.CJK_NGRAM)
+
+    def grams(self, text: str, n: int) -> set:
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def add(self, postings: Dict[str, List[int]], num: int, text: str, n: int) -> None:
+        for gram in self.grams(text, n):
+            postings.setdefault(gram, []).append(num)
+
+    def patch(self, postings: Dict[str, List[int]], copied: set, num: int,
+              text: str, n: int, add: bool) -> None:
+        # Postings are kept sorted. Each one is copied before its first change
+        for gram in self.grams(text, n):
+            if gram not in copied:
+                postings[gram] = list(postings.get(gram, ()))
+                copied.add(gram)
+            posting = postings[gram]
+            i = bisect.bisect_left(posting, num)
+            found = i < len(posting) and posting[i] == num
+            if add and not found:
+                posting.insert(i, num)
+            elif not add and found:
+                del posting[i]
+
+    def update(self, changes: Dict[int, Tuple[Optional[str], Optional[str]]]) -> 'NgramIndex':
+        # A copy with the (old, new) values of changes, leaving this index
+        # intact for the searches still running on it
+        index = copy.copy(self)
+        index.postings = dict(self.postings)
+        index.cjk_postings = dict(self.cjk_postings)
+        copied = set()
+        cjk_copied = set()
+        for num, (old, new) in changes.items():
+            if old == new:
+                continue
+            for value, add in ((old, False), (new, True)):
+                if value is None:
+                    continue
+                index.patch(index.postings, copied, num, value, self.NGRAM, add)
+                if self.CJK_PATTERN.search(value) is not None:
+                    index.patch(index.cjk_postings, cjk_copied, num, value, self.CJK_NGRAM, add)
+        return index
+
+    def candidates(self, text: str) -> Optional[List[int]]:
+        # Every string containing a CJK query also contains a CJK character,
+        # so the bigram postings are complete for such queries
+        if self.CJK_PATTERN.search(text) is not None and len(text) >= self.CJK_NGRAM:
+            postings, n = self.cjk_postings, self.CJK_NGRAM
+        elif len(text) >= self.NGRAM:
+            postings, n = self.postings, self.NGRAM
+        else:
+            return None
+
+        lists = []
+        for gram in self.grams(text, n):
+            posting = postings.get(gram)
+            if posting is None:
+                return []
+            lists.append(posting)
+        lists.sort(key=len)
+        result = set(lists[0])
+        for posting in lists[1:]:
+            result.intersection_update(posting)
+            if not result:
+                return []
+        return sorted(result)
+
+
+class FuzzyIndex:
+    # Symmetric delete over name words: one deletion on each side finds every
+    # word within one edit and substitutions/transpositions within two
+    MAX_DISTANCE = 2
+
+    def __init__(self, column: List[Optional[str]]) -> None:
+        self.words = {}
+        self.deletes = {}
+        for num, value in enumerate(column):
+            if value is None:
+                continue
+            for word in value.split():
+                self.words.setdefault(word, set()).add(num)
+        for word in self.words:
+            for delete in self.variants(word):
+                self.deletes.setdefault(delete, []).append(word)
+
+    def update(self, changes: Dict[int, Tuple[Optional[str], Optional[str]]]) -> 'FuzzyIndex':
+        # Copy on write like NgramIndex.update. Words that lose every name are
+        # kept with no positions
+        index = copy.copy(self)
+        index.words = dict(self.words)
+        index.deletes = dict(self.deletes)
+        copied = set()
+        for num, (old, new) in changes.items():
+            if old == new:
+                continue
+            for value, add in ((old, False), (new, True)):
+                if value is None:
+                    continue
+                for word in value.split():
+                    if word not in index.words:
+                        for delete in self.variants(word):
+                            index.deletes[delete] = [*index.deletes.get(delete, ()), word]
+                        index.words[word] = set()
+                        copied.add(word)
+                    elif word not in copied:
+                        index.words[word] = set(index.words[word])
+                        copied.add(word)
+                    if add:
+                        index.words[word].add(num)
+                    else:
+                        index.words[word].discard(num)
+        return index
+
+    @staticmethod
+    def variants(word: str) -> set:
+        return {word, *(word[:i] + word[i + 1:] for i in range(len(word)))}
+
+    @staticmethod
+    def distance(a: str, b: str, max_distance: int) -> int:
+        if abs(len(a) - len(b)) > max_distance:
+            return max_distance + 1
+        previous = list(range(len(b) + 1))
+        for i, ca in enumerate(a, 1):
+            current = [i]
+            for j, cb in enumerate(b, 1):
+                current.append(min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (ca != cb)
+                ))
+            if min(current) > max_distance:
+                return max_distance + 1
+            previous = current
+        return previous[-1]
+
+    def max_distance(self, word: str) -> int:
+        return 1 if len(word) < 5 else self.MAX_DISTANCE
+
+    def match_word(self, word: str) -> Dict[str, int]:
+        max_distance = self.max_distance(word)
+        matches = {}
+        for delete in self.variants(word):
+            for candidate in self.deletes.get(delete, ()):
+                if candidate in matches:
+                    continue
+                distance = self.distance(word, candidate, max_distance)
+                if distance <= max_distance:
+                    matches[candidate] = distance
+        return matches
+
+    def search(self, text: str) -> Dict[int, int]:
+        result = None
+        for word in text.split():
+            positions = {}
+            for candidate, distance in self.match_word(word).items():
+                for num in self.words[candidate]:
+                    if distance < positions.get(num, distance + 1):
+                        positions[num] = distance
+            if result is None:
+                result = positions
+            else:
+                result = {
+                    num: distance + positions[num]
+                    for num, distance in result.items()
+                    if num in positions
+                }
+            if not result:
+                return {}
+        return result or {}
+
+
+class PatchedValues(Sequence):
+    # The values of an updated catalog, without building the records that
+    # did not change
+    def __init__(self, values: Sequence, patches: Dict[int, Any], size: int) -> None:
+        if isinstance(values, PatchedValues):
+            patches = {**values.patches, **patches}
+            values = values.values
+        self.values = values
+        self.patches = patches
+        self.size = size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, num: int) -> Any:
+        if isinstance(num, slice):
+            return [self[i] for i in range(*num.indices(len(self)))]
+        if num < 0:
+            num += self.size
+        if num in self.patches:
+            return self.patches[num]
+        return self.values[num]
+
+
+class Catalog:
+    def __init__(self, data: dict,
+                 normalize: Callable[[List[Optional[str]]], List[Optional[str]]],
+                 items: Optional[bool] = False,
+                 ngram: Optional[bool] = False) -> None:
+        self.data = data
+        self.normalize = normalize
+        # Only the main language catalog is ever asked for styles, so they are
+        # built on first use
+        self.styles = None
+        if isinstance(data, SnapshotDict):
+            self.load_columns(data, normalize, items)
+        else:
+            self.load_values(data, normalize, items)
+        if items:
+            for num, backend in enumerate(self.backends):
+                self.types.setdefault(backend, []).append(num)
+        self.indexes = {}
+        if ngram:
+            self.indexes['name'] = NgramIndex(self.names)
+            self.indexes['id'] = NgramIndex(self.ids)
+            if items:
+                self.indexes['set'] = NgramIndex(self.sets)
+        self.fuzzy_index = None
+
+    def load_values(self, data: dict,
+                    normalize: Callable[[List[Optional[str]]], List[Optional[str]]],
+                    items: bool) -> None:
+        self.values = [
+            value for value in data.values()
+            if not items or value['name'] is not None
+        ]
+        self.names = normalize([value['name'] for value in self.values])
+        self.ids = [sys.intern(value['id'].casefold()) for value in self.values]
+        self.sets = None
+        self.backends = None
+        self.types = {}
+        if items:
+            self.sets = normalize([value.get('set') for value in self.values])
+            self.backends = [
+                sys.intern(value['type']['backendValue'])
+                for value in self.values
+            ]
+
+    def load_columns(self, data: SnapshotDict,
+                     normalize: Callable[[List[Optional[str]]], List[Optional[str]]],
+                     items: bool) -> None:
+        # Build the columns straight from the snapshot without a dict per record
+        names = data.column(('name',))
+        ids = data.column(('id',))
+        rows = [
+            row for row, name in enumerate(names)
+            if not items or name is not None
+        ]
+        self.values = data.records(rows)
+        self.names = normalize([names[row] for row in rows])
+        self.ids = [sys.intern(ids[row].casefold()) for row in rows]
+        self.sets = None
+        self.backends = None
+        self.types = {}
+        if items:
+            sets = data.column(('set',))
+            backends = data.column(('type', 'backendValue'))
+            self.sets = normalize([sets[row] for row in rows])
+            self.backends = [backends[row] for row in rows]
+
+    def load_styles(self) -> Dict[str, List[Tuple[str, dict]]]:
+        if isinstance(self.data, SnapshotDict):
+            ids = self.data.column(('id',))
+            variants = self.data.column(('variants',))
+        else:
+            ids = [value['id'] for value in self.data.values()]
+            variants = [value.get('variants') for value in self.data.values()]
+        styled = [
+            (id.casefold(), styles)
+            for id, styles in zip(ids, variants)
+            if styles
+        ]
+        names = iter(self.normalize([
+            style['name']
+            for _, styles in styled
+            for style in styles
+        ]))
+        return {
+            id: [(next(names), style) for style in styles]
+            for id, styles in styled
+        }
+
+    def get_styles(self, id: str) -> List[Tuple[str, dict]]:
+        if self.styles is None:
+            self.styles = self.load_styles()
+        return self.styles.get(id.casefold(), [])
+
+    def update(self, data: Mapping, keys: Iterable[str]) -> 'Catalog':
+        # A copy with the records of keys read again from data, which is a
+        # newer state of this catalog. This one is left intact for the
+        # searches still running on it. A removed record leaves a hole, so
+        # that the positions in the indexes stay valid
+        catalog = copy.copy(self)
+        catalog.data = data
+        if not keys:
+            return catalog
+        items = self.backends is not None
+        nums = {id: num for num, id in enumerate(self.ids) if id is not None}
+        changed = []
+        for key in keys:
+            num = nums.get(key)
+            value = data.get(key)
+            if items and value is not None and value['name'] is None:
+                value = None
+            if num is None and value is None:
+                continue
+            changed.append((num, value))
+
+        catalog.names = list(self.names)
+        catalog.ids = list(self.ids)
+        if items:
+            catalog.sets = list(self.sets)
+            catalog.backends = list(self.backends)
+            catalog.types = dict(self.types)
+        names = self.normalize([
+            value['name'] if value is not None else None
+            for _, value in changed
+        ])
+        sets = self.normalize([
+            value.get('set') if value is not None else None
+            for _, value in changed
+        ]) if items else None
+        patches = {}
+        copied = set()
+        for i, (num, value) in enumerate(changed):
+            if num is None:
+                num = len(catalog.names)
+                catalog.names.append(None)
+                catalog.ids.append(None)
+                if items:
+                    catalog.sets.append(None)
+                    catalog.backends.append(None)
+            patches[num] = value
+            catalog.names[num] = names[i]
+            catalog.ids[num] = sys.intern(value['id'].casefold()) if value is not None else None
+            if not items:
+                continue
+            catalog.sets[num] = sets[i]
+            old = self.backends[num] if num < len(self.backends) else None
+            new = sys.intern(value['type']['backendValue']) if value is not None else None
+            catalog.backends[num] = new
+            if old == new:
+                continue
+            for backend, add in ((old, False), (new, True)):
+                if backend is None:
+                    continue
+                if backend not in copied:
+                    catalog.types[backend] = list(catalog.types.get(backend, ()))
+                    copied.add(backend)
+                positions = catalog.types[backend]
+                if add:
+                    bisect.insort(positions, num)
+                else:
+                    positions.remove(num)
+        catalog.values = PatchedValues(self.values, patches, len(catalog.names))
+
+        def changes(old: List[Optional[str]], new: List[Optional[str]]) -> Dict[int, Tuple]:
+            return {
+                num: (old[num] if num < len(old) else None, new[num])
+                for num in patches
+            }
+
+        catalog.indexes = {
+            mode: index.update(changes(self.column(mode), catalog.column(mode)))
+            for mode, index in self.indexes.items()
+        }
+        if self.fuzzy_index is not None:
+            catalog.fuzzy_index = self.fuzzy_index.update(changes(self.names, catalog.names))
+        if self.styles is not None:
+            catalog.styles = dict(self.styles)
+            for key in keys:
+                catalog.styles.pop(key, None)
+                value = data.get(key)
+                styles = value.get('variants') if value is not None else None
+                if styles:
+                    catalog.styles[key] = list(zip(
+                        self.normalize([style['name'] for style in styles]),
+                        styles
+                    ))
+        return catalog
+
+    def column(self, mode: str) -> List[Optional[str]]:
+        if mode == 'name':
+            return self.names
+        elif mode == 'id':
+            return self.ids
+        elif mode == 'set':
+            return self.sets
+        raise ValueError(f"Unknown search mode '{mode}'")
+
+    def positions(self, types: Optional[List[str]] = None) -> Iterable[int]:
+        if types is None:
+            return range(len(self.values))
+        partitions = [self.types[type] for type in set(types) if type in self.types]
+        if len(partitions) == 1:
+            return partitions[0]
+        return heapq.merge(*partitions)
+
+    def match(self, mode: str, text: str,
+              types: Optional[List[str]] = None) -> List[int]:
+        column = self.column(mode)
+        index = self.indexes.get(mode)
+        candidates = index.candidates(text) if index is not None else None
+        if candidates is None:
+            candidates = self.positions(types)
+        elif types is not None:
+            types = set(types)
+            candidates = [num for num in candidates if self.backends[num] in types]
+        return [
+            num
+            for num in candidates
+            if column[num] is not None
+            and text in column[num]
+        ]
+
+    def search(self, mode: str, text: str,
+               types: Optional[List[str]] = None) -> List[dict]:
+        return [self.values[num] for num in self.match(mode, text, types)]
+
+    def get_fuzzy_index(self) -> 'FuzzyIndex':
+        if self.fuzzy_index is None:
+            self.fuzzy_index = FuzzyIndex(self.names)
+        return self.fuzzy_index
+
+    def rank_matches(self, text: str,
+                     types: Optional[List[str]] = None) -> Dict[int, Tuple[int, int]]:
+        # Rank 0: exact, 1: prefix, 2: substring. Exact matches are returned alone
+        ranked = {}
+        for num in self.match('name', text, types):
+            name = self.names[num]
+            if name == text:
+                ranked[num] = (0, 0)
+            elif name.startswith(text):
+                ranked[num] = (1, 0)
+            else:
+                ranked[num] = (2, 0)
+        exact = {num: rank for num, rank in ranked.items() if rank[0] == 0}
+        return exact or ranked
+
+    def rank_fuzzy(self, text: str,
+                   types: Optional[List[str]] = None) -> Dict[int, Tuple[int, int]]:
+        # Rank 3: every word within edit distance
+        if types is not None:
+            types = set(types)
+        return {
+            num: (3, distance)
+            for num, distance in self.get_fuzzy_index().search(text).items()
+            if types is None or self.backends[num] in types
+        }
+
+    def best(self, ranked: Dict[int, Tuple[int, int]],
+             limit: Optional[int] = 10) -> List[dict]:
+        def key(x):
+            return (*x[1], len(self.names[x[0]]), x[0])
+
+        if limit is None:
+            best = sorted(ranked.items(), key=key)
+        else:
+            best = heapq.nsmallest(limit, ranked.items(), key=key)
+        return [self.values[num] for num, _ in best]
+
+
+class CosmeticIndex:
+    def __init__(self, normalizer: Normalizer,
+                 ngram: Optional[bool] = True,
+                 cache_size: Optional[int] = 1024,
+                 offload_size: Optional[int] = 2000,
+                 offload_length: Optional[int] = 32,
+                 sub_loader: Optional[Callable[[], Tuple[Mapping, Mapping]]] = None) -> None:
+        self.normalizer = normalizer
+        self.ngram = ngram
+        self.offload_size = offload_size
+        self.offload_length = offload_length
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='searcher')
+        # lock and sub_lock are only held to read or swap references, since
+        # load and evict_sub take them on the event loop. Builds run outside
+        # them, one at a time under the build locks, and are only stored if
+        # the data did not change meanwhile
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        self.cache_lock = threading.Lock()
+
+        self.main_items = CaseInsensitiveDict()
+        self.main_playlists = CaseInsensitiveDict()
+        self.views = {}
+        self.types = None
+
+        # The sub language catalogs are only consulted when the main ones find
+        # nothing, so they are loaded on first use and can be evicted
+        self.sub_loader = sub_loader
+        self.sub_lock = threading.Lock()
+        self.sub_build_lock = threading.Lock()
+        self.sub_generation = 0
+        self.sub_items = None
+        self.sub_playlists = None
+        self.sub_views = {}
+        self.sub_used = 0.0
+
+        self.generation = 0
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, main_items: CaseInsensitiveDict, main_playlists: CaseInsensitiveDict,
+             views: Optional[dict] = None) -> None:
+        with self.lock:
+            self.main_items = main_items
+            self.main_playlists = main_playlists
+            self.views = views or {}
+            self.types = None
+            self.generation += 1
+        self.evict_sub()
+
+    async def build_views(self, main_items: CaseInsensitiveDict,
+                          main_playlists: CaseInsensitiveDict) -> dict:
+        # Builds every view in use for the new data, off the event loop. When
+        # the new data only adds journal deltas to the loaded snapshots, the
+        # views are updated with the changed records instead
+        with self.lock:
+            data = (self.main_items, self.main_playlists)
+            current = dict(self.views)
+        changes = [
+            new.changes_since(old) if isinstance(new, SnapshotDict) else None
+            for new, old in zip((main_items, main_playlists), data)
+        ]
+        views = {}
+        for (case_insensitive, convert_kanji), catalogs in current.items():
+            views[(case_insensitive, convert_kanji)] = await self.run(
+                self.build_catalogs,
+                (main_items, main_playlists),
+                case_insensitive,
+                convert_kanji,
+                catalogs,
+                changes
+            )
+        return views
+
+    async def aload(self, main_items: CaseInsensitiveDict,
+                    main_playlists: CaseInsensitiveDict) -> None:
+        views = await self.build_views(main_items, main_playlists)
+        self.load(main_items, main_playlists, views=views)
+
+    async def run(self, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    def normalize(self, text: str, case_insensitive: bool, convert_kanji: bool) -> str:
+        return self.normalizer.normalize(text, case_insensitive, convert_kanji)
+
+    def build_catalogs(self, data: Tuple[CaseInsensitiveDict, ...],
+                       case_insensitive: bool, convert_kanji: bool,
+                       catalogs: Optional[Dict[str, Catalog]] = None,
+                       changes: Optional[List[Optional[set]]] = None) -> Dict[str, Catalog]:
+        # With catalogs of an older state of data, those that only have the
+        # changed keys in changes are updated instead
+        items, playlists = data
+        item_changes, playlist_changes = changes or (None, None)
+        normalize = partial(
+            self.normalizer.normalize_many,
+            case_insensitive=case_insensitive,
+            convert_kanji=convert_kanji
+        )
+        if item_changes is not None:
+            item_catalog = catalogs['items'].update(items, item_changes)
+        else:
+            item_catalog = Catalog(items, normalize, items=True, ngram=self.ngram)
+        if playlist_changes is not None:
+            playlist_catalog = catalogs['playlists'].update(playlists, playlist_changes)
+        else:
+            playlist_catalog = Catalog(playlists, normalize, ngram=self.ngram)
+        return {
+            'items': item_catalog,
+            'playlists': playlist_catalog
+        }
+
+    def is_built(self, case_insensitive: bool, convert_kanji: bool) -> bool:
+        return (case_insensitive, convert_kanji) in self.views
+
+    def catalogs(self, case_insensitive: bool, convert_kanji: bool) -> Dict[str, Catalog]:
+        key = (case_insensitive, convert_kanji)
+        catalogs = self.views.get(key)
+        if catalogs is None:
+            with self.build_lock:
+                catalogs = self.views.get(key)
+                if catalogs is None:
+                    with self.lock:
+                        generation = self.generation
+                        data = (self.main_items, self.main_playlists)
+                    catalogs = self.build_catalogs(data, case_insensitive, convert_kanji)
+                    with self.lock:
+                        if self.generation == generation:
+                            self.views[key] = catalogs
+        return catalogs
+
+    def is_typed(self) -> bool:
+        return self.types is not None
+
+    def item_types(self) -> Tuple[Mapping, Dict[str, List[int]]]:
+        # The rows of every main item by backend type, read from the catalog
+        # itself since the views drop the items without a name
+        types = self.types
+        if types is None:
+            with self.build_lock:
+                types = self.types
+                if types is None:
+                    with self.lock:
+                        generation = self.generation
+                        items = self.main_items
+                    if isinstance(items, SnapshotDict):
+                        backends = items.column(('type', 'backendValue'))
+                    else:
+                        backends = [value['type']['backendValue'] for value in items.values()]
+                    rows = {}
+                    for row, backend in enumerate(backends):
+                        rows.setdefault(backend, []).append(row)
+                    types = (items, rows)
+                    with self.lock:
+                        if self.generation == generation:
+                            self.types = types
+        return types
+
+    def get_items(self, types: List[str]) -> List[dict]:
+        items, rows = self.item_types()
+        rows = sorted(
+            row
+            for type in set(types)
+            for row in rows.get(type, [])
+        )
+        if isinstance(items, SnapshotDict):
+            return list(items.records(rows))
+        values = list(items.values())
+        return [values[row] for row in rows]
+
+    def sub_catalogs(self, case_insensitive: bool, convert_kanji: bool) -> Dict[str, Catalog]:
+        key = (case_insensitive, convert_kanji)
+        self.sub_used = time.monotonic()
+        catalogs = self.sub_views.get(key)
+        if catalogs is None:
+            with self.sub_build_lock:
+                catalogs = self.sub_views.get(key)
+                if catalogs is None:
+                    with self.sub_lock:
+                        generation = self.sub_generation
+                        items, playlists = self.sub_items, self.sub_playlists
+                    if items is None:
+                        if self.sub_loader is not None:
+                            items, playlists = self.sub_loader()
+                        else:
+                            items, playlists = CaseInsensitiveDict(), CaseInsensitiveDict()
+                    catalogs = self.build_catalogs((items, playlists), case_insensitive, convert_kanji)
+                    with self.sub_lock:
+                        if self.sub_generation == generation:
+                            self.sub_items, self.sub_playlists = items, playlists
+                            self.sub_views[key] = catalogs
+        return catalogs
+
+    def evict_sub(self, idle: Optional[float] = None) -> bool:
+        # Without idle, also discards a load in progress, whose data may be
+        # older than the catalogs just loaded
+        with self.sub_lock:
+            if idle is not None and (self.sub_items is None
+                                     or time.monotonic() - self.sub_used < idle):
+                return False
+            evicted = self.sub_items is not None
+            self.sub_items = None
+            self.sub_playlists = None
+            self.sub_views = {}
+            self.sub_generation += 1
+            return evicted
+
+    def cache_get(self, key: Tuple) -> Optional[List[dict]]:
+        with self.cache_lock:
+            if self.cache_generation != self.generation:
+                self.cache.clear()
+                self.cache_generation = self.generation
+            result = self.cache.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return list(result)
+
+    def cache_set(self, key: Tuple, result: List[dict], generation: int) -> None:
+        if not self.cache_size:
+            return
+        with self.cache_lock:
+            if generation != self.generation or generation != self.cache_generation:
+                return
+            self.cache[key] = list(result)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def cache_info(self) -> Dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.cache),
+            'max_size': self.cache_size,
+            'generation': self.generation
+        }
 
 
 class Searcher:
-    def __init__(self, main_items: CaseInsensitiveDict, sub_items: CaseInsensitiveDict,
-                 main_playlists: CaseInsensitiveDict, sub_playlists: CaseInsensitiveDict,
+    def __init__(self, index: CosmeticIndex,
                  case_insensitive: bool, convert_kanji: bool) -> None:
-        self.main_items = main_items
-        self.sub_items = sub_items
-        self.main_playlists = main_playlists
-        self.sub_playlists = sub_playlists
+        self.index = index
         self.case_insensitive = case_insensitive
         self.convert_kanji = convert_kanji
-        self.kakasi = kakasi()
-        self.kakasi.setMode('J', 'H')
-        self.converter = self.kakasi.getConverter()
+
+    @property
+    def main_items(self) -> CaseInsensitiveDict:
+        return self.index.main_items
+
+    @property
+    def main_playlists(self) -> CaseInsensitiveDict:
+        return self.index.main_playlists
+
+    @property
+    def catalogs(self) -> Dict[str, Catalog]:
+        return self.index.catalogs(self.case_insensitive, self.convert_kanji)
+
+    @property
+    def sub_catalogs(self) -> Dict[str, Catalog]:
+        return self.index.sub_catalogs(self.case_insensitive, self.convert_kanji)
+
+    def normalize(self, text: str) -> str:
+        return self.index.normalize(text, self.case_insensitive, self.convert_kanji)
+
+    def is_heavy(self, text: str) -> bool:
+        if not self.index.is_built(self.case_insensitive, self.convert_kanji):
+            return True
+        if self.convert_kanji and len(text) > self.index.offload_length:
+            return True
+        return (len(text) < NgramIndex.NGRAM
+                and len(self.main_items) > self.index.offload_size)
+
+    async def prepare(self) -> None:
+        if not self.index.is_built(self.case_insensitive, self.convert_kanji):
+            await self.index.run(
+                self.index.catalogs,
+                self.case_insensitive,
+                self.convert_kanji
+            )
+
+    async def run(self, func: Callable, text: str, *args: Any, **kwargs: Any) -> Any:
+        if self.is_heavy(text):
+            return await self.index.run(func, text, *args, **kwargs)
+        # The fallbacks may have to load the sub language catalogs or build a
+        # fuzzy index, so only the main lookup runs on the loop
+        result = func(text, *args, fallback=False, **kwargs)
+        if len(result) == 0:
+            return await self.index.run(func, text, *args, **kwargs)
+        return result
+
+    def cache_info(self) -> Dict[str, Any]:
+        return self.index.cache_info()
 
     def get_item(self, id: str) -> Optional[dict]:
         return self.main_items.get(id)
 
-    def search_item(self, mode: str, text: str,
-                    item: Optional[str] = None) -> List[dict]:
-        if self.case_insensitive:
-            text = jaconv.kata2hira(text.casefold())
-        if self.convert_kanji:
-            text = self.converter.do(text)
+    def get_items(self, item: str) -> List[dict]:
+        return self.index.get_items(item.split(','))
 
-        result = []
+    async def aget_items(self, item: str) -> List[dict]:
+        if self.index.is_typed():
+            return self.get_items(item)
+        return await self.index.run(self.get_items, item)
 
-        def find(cosmetic):
-            if (item and cosmetic['type']['backendValue'] not in item.split(',')
-                    or cosmetic['name'] is None):
-                return
-            if mode == 'name':
-                name = cosmetic['name']
-                if self.case_insensitive:
-                    name = jaconv.kata2hira(cosmetic['name'].casefold())
-                if self.convert_kanji:
-                    name = self.converter.do(name)
-                if text in name:
-                    result.append(cosmetic)
-            elif mode == 'id':
-                if text in (cosmetic['id'].casefold()):
-                    result.append(cosmetic)
-            elif mode == 'set':
-                if cosmetic.get('set') is None:
-                    return
-                name = cosmetic['name']
-                if self.case_insensitive:
-                    name = jaconv.kata2hira(name.casefold())
-                if self.convert_kanji:
-                    name = self.converter.do(name)
-                if text in name:
-                    result.append(cosmetic)
-
-        for cosmetic in self.main_items.values():
-            find(cosmetic)
+    def search_item(self, mode: str, text: str,
+                    item: Optional[str] = None,
+                    fallback: Optional[bool] = True) -> List[dict]:
+        text = self.normalize(text)
+        key = ('item', mode, text, item or None,
+               self.case_insensitive, self.convert_kanji)
+        generation = self.index.generation
+        result = self.index.cache_get(key)
+        if result is not None:
+            return result
+        types = item.split(',') if item else None
+        result = self.catalogs['items'].search(mode, text, types)
         if len(result) == 0:
-            for cosmetic in self.sub_items.values():
-                find(cosmetic)
+            if not fallback:
+                return result
+            result = self.sub_catalogs['items'].search(mode, text, types)
 
+        self.index.cache_set(key, result, generation)
         return result
 
+    async def asearch_item(self, mode: str, text: str,
+                           item: Optional[str] = None) -> List[dict]:
+        return await self.run(partial(self.search_item, mode), text, item)
+
     def search_item_name_id(self, text: str,
-                            item: Optional[str] = None) -> List[dict]:
-        items = self.search_item('name', text, item)
+                            item: Optional[str] = None,
+                            fallback: Optional[bool] = True) -> List[dict]:
+        items = self.search_item('name', text, item, fallback)
         if len(items) == 0:
-            items = self.search_item('id', text, item)
+            items = self.search_item('id', text, item, fallback)
 
         return items
 
+    async def asearch_item_name_id(self, text: str,
+                                   item: Optional[str] = None) -> List[dict]:
+        return await self.run(self.search_item_name_id, text, item)
+
+    def rank_item(self, text: str, types: Optional[List[str]],
+                  fuzzy: bool, fallback: bool) -> Tuple[Catalog, Dict[int, Tuple[int, int]]]:
+        # The match tiers are tried on the main catalog and then the sub one,
+        # fuzzy matches only when neither contains the text
+        main = self.catalogs['items']
+        ranked = main.rank_matches(text, types)
+        if ranked or not fallback:
+            return main, ranked
+        sub = self.sub_catalogs['items']
+        ranked = sub.rank_matches(text, types)
+        if ranked or not fuzzy:
+            return sub, ranked
+        ranked = main.rank_fuzzy(text, types)
+        if ranked:
+            return main, ranked
+        return sub, sub.rank_fuzzy(text, types)
+
+    def search_item_ranked(self, text: str, item: Optional[str] = None,
+                           limit: Optional[int] = 10,
+                           fuzzy: Optional[bool] = True,
+                           fallback: Optional[bool] = True) -> List[dict]:
+        text = self.normalize(text)
+        key = ('ranked', text, item or None, limit, fuzzy,
+               self.case_insensitive, self.convert_kanji)
+        generation = self.index.generation
+        result = self.index.cache_get(key)
+        if result is not None:
+            return result
+        types = item.split(',') if item else None
+        catalog, ranked = self.rank_item(text, types, fuzzy, fallback)
+        result = catalog.best(ranked, limit)
+        if len(result) == 0 and not fallback:
+            return result
+
+        self.index.cache_set(key, result, generation)
+        return result
+
+    async def asearch_item_ranked(self, text: str, item: Optional[str] = None,
+                                  limit: Optional[int] = 10,
+                                  fuzzy: Optional[bool] = True) -> List[dict]:
+        return await self.run(self.search_item_ranked, text, item, limit, fuzzy)
+
+    def count_item_ranked(self, text: str, item: Optional[str] = None,
+                          fuzzy: Optional[bool] = True) -> int:
+        # How many results search_item_ranked has without a limit, without
+        # building them
+        types = item.split(',') if item else None
+        return len(self.rank_item(self.normalize(text), types, fuzzy, True)[1])
+
+    async def acount_item_ranked(self, text: str, item: Optional[str] = None,
+                                 fuzzy: Optional[bool] = True) -> int:
+        return await self.index.run(self.count_item_ranked, text, item, fuzzy)
+
     def get_style(self, id: str) -> List[dict]:
         item = self.main_items.get(id)
         if item is None or item.get('variants') is None:
@@ -137,63 +973,46 @@ class Searcher:
         return item['variants']
 
     def search_style(self, id: str, text: str) -> List[dict]:
-        if self.case_insensitive:
-            text = jaconv.kata2hira(text.casefold())
-        if self.convert_kanji:
-            text = self.converter.do(text)
+        text = self.normalize(text)
 
-        styles = self.get_style(id)
-
-        result = []
+        if id is None:
+            return []
+        styles = self.catalogs['items'].get_styles(id)
 
-        for style in styles:
-            name = style['name']
-            if self.case_insensitive:
-                name = jaconv.kata2hira(name.casefold())
-            if self.convert_kanji:
-                name = self.converter.do(name)
-            if text in name:
-                result.append(style)
-
-        return result
+        return [style for name, style in styles if text in name]
 
 
     def get_playlist(self, id: str) -> Optional[dict]:
         return self.main_playlists.get(id)
 
-    def search_playlist(self, mode: str, text: str) -> List[dict]:
-        if self.case_insensitive:
-            text = jaconv.kata2hira(text.casefold())
-        if self.convert_kanji:
-            text = self.converter.do(text)
-
-        result = []
-
-        def find(playlist):
-            if mode == 'name':
-                if self.case_insensitive:
-                    name = jaconv.kata2hira(playlist['name'].casefold())
-                else:
-                    name = playlist['name']
-                if self.convert_kanji:
-                    name = self.converter.do(name)
-                if text in name:
-                    result.append(playlist)
-            elif mode == 'id':
-                if text in playlist['id'].casefold():
-                    result.append(playlist)
-
-        for playlist in self.main_playlists.values():
-            find(playlist)
+    def search_playlist(self, mode: str, text: str,
+                        fallback: Optional[bool] = True) -> List[dict]:
+        text = self.normalize(text)
+        key = ('playlist', mode, text, None,
+               self.case_insensitive, self.convert_kanji)
+        generation = self.index.generation
+        result = self.index.cache_get(key)
+        if result is not None:
+            return result
+        result = self.catalogs['playlists'].search(mode, text)
         if len(result) == 0:
-            for playlist in self.sub_playlists.values():
-                find(playlist)
+            if not fallback:
+                return result
+            result = self.sub_catalogs['playlists'].search(mode, text)
 
+        self.index.cache_set(key, result, generation)
         return result
 
-    def search_playlist_name_id(self, text: str) -> List[dict]:
-        playlists = self.search_playlist('name', text)
+    async def asearch_playlist(self, mode: str, text: str) -> List[dict]:
+        return await self.run(partial(self.search_playlist, mode), text)
+
+    def search_playlist_name_id(self, text: str,
+                                fallback: Optional[bool] = True) -> List[dict]:
+        playlists = self.search_playlist('name', text, fallback)
         if len(playlists) == 0:
-            playlists = self.search_playlist('id', text)
+            playlists = self.search_playlist('id', text, fallback)
 
         return playlists
+
+    async def asearch_playlist_name_id(self, text: str) -> List[dict]:
+        return await self.run(self.search_playlist_name_id, text)
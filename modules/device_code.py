@@ -1,11 +1,16 @@
 import asyncio
 import datetime
+import hashlib
 import json
-from typing import Any, Optional, Tuple, Union
+import tempfile
+from functools import partial
+from typing import Any, Callable, Optional, Tuple, Union
 
 import aiohttp
 import fortnitepy
 
+from .jsonstream import JSONArrayStream, PathPart
+
 ACCOUNT_PUBLIC_SERVICE = "https://account-public-service-prod03.ol.epicgames.com"
 OAUTH_TOKEN = f"{ACCOUNT_PUBLIC_SERVICE}/account/api/oauth/token"
 EXCHANGE = f"{ACCOUNT_PUBLIC_SERVICE}/account/api/oauth/exchange"
@@ -49,6 +54,79 @@ class HTTPClient:
                   ) -> Union[aiohttp.ClientResponse, Union[bytes, dict, list, str]]:
         return await self.request("GET", url, **kwargs)
 
+    async def get_conditional(self, url: str, metadata: Optional[dict] = None,
+                              path: Optional[Tuple[PathPart, ...]] = None,
+                              convert: Optional[Callable[[Any], Any]] = None,
+                              **kwargs: dict
+                              ) -> Tuple[Optional[Union[bytes, dict, list, str]], dict]:
+        # Returns (None, metadata) when the server answers 304 or the body
+        # hashes the same as last time.
+        # With path, the body is spooled to a temporary file while it is
+        # hashed, and the array at path is only parsed when the hash changed.
+        # Only the elements convert returns something for are kept. Writing
+        # the spool, parsing and convert run in the default executor
+        request = {'url': url, 'params': kwargs.get('params')}
+        if metadata is None or metadata.get('request') != request:
+            metadata = {}
+        headers = dict(kwargs.pop('headers', None) or {})
+        if metadata.get('etag') is not None:
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified') is not None:
+            headers['If-Modified-Since'] = metadata['last_modified']
+
+        async with self.session.request("GET", url, headers=headers, **kwargs) as response:
+            if response.status == 304:
+                return None, metadata
+            loop = asyncio.get_running_loop()
+            sha256 = hashlib.sha256()
+            with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as spool:
+                if path is not None and response.status < 400:
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        sha256.update(chunk)
+                        await loop.run_in_executor(None, spool.write, chunk)
+                else:
+                    body = await response.read()
+                    sha256.update(body)
+                new_metadata = {
+                    'request': request,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'hash': sha256.hexdigest()
+                }
+                if response.status < 400 and new_metadata['hash'] == metadata.get('hash'):
+                    return None, new_metadata
+                if path is not None and response.status < 400:
+                    data = await loop.run_in_executor(
+                        None,
+                        self.read_array,
+                        spool,
+                        path,
+                        convert
+                    )
+                    return data, new_metadata
+            text = body.decode('utf-8')
+            if 'application/json' in response.headers.get('content-type', ''):
+                data = json.loads(text)
+            else:
+                data = text
+            if isinstance(data, dict) and "errorCode" in data:
+                raise HTTPException(data["errorCode"], data["errorMessage"])
+            if path is not None:
+                response.raise_for_status()
+            return data, new_metadata
+
+    @staticmethod
+    def read_array(file: Any, path: Tuple[PathPart, ...],
+                   convert: Optional[Callable[[Any], Any]]) -> list:
+        file.seek(0)
+        data = []
+        for value in JSONArrayStream(iter(partial(file.read, 64 * 1024), b''), path):
+            if convert is not None:
+                value = convert(value)
+            if value is not None:
+                data.append(value)
+        return data
+
     async def post(self, url: str, **kwargs: dict
                    ) -> Union[aiohttp.ClientResponse, Union[bytes, dict, list, str]]:
         return await self.request("POST", url, **kwargs)
@@ -1,14 +1,85 @@
 # -*- coding: utf-8 -*-
 from json.encoder import (_make_iterencode, JSONEncoder,
                           encode_basestring_ascii, INFINITY,
-                          encode_basestring)
+                          encode_basestring, c_make_encoder)
 
 import discord
 import fortnitepy
 
+from .records import Record
+
+PLAIN = object()
+SEQUENCE = object()
+MAPPING = object()
+OTHER = object()
+
 
 class MyJSONEncoder(JSONEncoder):
+    # How values of each type are encoded, filled in as types are seen
+    kinds = {
+        str: PLAIN,
+        int: PLAIN,
+        float: PLAIN,
+        bool: PLAIN,
+        type(None): PLAIN,
+        list: SEQUENCE,
+        tuple: SEQUENCE,
+        dict: MAPPING
+    }
+
+    def kind(self, cls):
+        kind = self.kinds.get(cls)
+        if kind is None:
+            # Same order of checks as the pure Python encoder
+            if issubclass(getattr(cls, '_actual_enum_cls_', cls), discord.Enum):
+                kind = OTHER
+            elif issubclass(cls, (str, int, float)):
+                kind = PLAIN
+            elif issubclass(cls, (list, tuple)):
+                kind = SEQUENCE
+            elif issubclass(cls, dict):
+                kind = MAPPING
+            else:
+                kind = OTHER
+            self.kinds[cls] = kind
+        return kind
+
+    def convert(self, o):
+        # Replaces everything that goes through default() with its result.
+        # Returns o itself when nothing in it is replaced, so plain data is
+        # not copied
+        kinds = self.kinds
+        kind = kinds.get(o.__class__) or self.kind(o.__class__)
+        if kind is PLAIN:
+            return o
+        elif kind is SEQUENCE:
+            values = None
+            for num, value in enumerate(o):
+                if kinds.get(value.__class__) is not PLAIN:
+                    converted = self.convert(value)
+                    if converted is not value:
+                        if values is None:
+                            values = list(o)
+                        values[num] = converted
+            return o if values is None else values
+        elif kind is MAPPING:
+            values = None
+            for key, value in o.items():
+                if kinds.get(value.__class__) is not PLAIN:
+                    converted = self.convert(value)
+                    if converted is not value:
+                        if values is None:
+                            values = {}
+                        values[key] = converted
+            return o if values is None else {**o, **values}
+        else:
+            return self.convert(self.default(o))
+
     def iterencode(self, o, _one_shot=False):
+        if _one_shot and c_make_encoder is not None and self.indent is None:
+            # The C encoder has no isinstance hook and would encode discord
+            # enums as lists, so they are converted before
+            return super().iterencode(self.convert(o), _one_shot)
         if self.check_circular:
             markers = {}
         else:
@@ -53,7 +124,9 @@ class MyJSONEncoder(JSONEncoder):
         return isinstance(obj, cls)
 
     def default(self, obj):
-        if isinstance(obj, fortnitepy.Enum):
+        if isinstance(obj, Record):
+            return obj.to_dict()
+        elif isinstance(obj, fortnitepy.Enum):
             if isinstance(obj, fortnitepy.Platform):
                 return obj.value.upper()
             return obj.name.upper()
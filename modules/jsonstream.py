@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import codecs
+import json
+import re
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple, Union
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')
+
+PathPart = Union[str, Callable[[str], bool]]
+
+
+class JSONStreamError(ValueError):
+    pass
+
+
+class JSONArrayStream:
+    # Yields the elements of the array found at path, parsing the document
+    # chunk by chunk. Only one element is held at a time, everything outside
+    # the path is skipped value by value.
+    # A path part is either a key or a predicate over keys
+    def __init__(self, chunks: Iterable[bytes],
+                 path: Optional[Tuple[PathPart, ...]] = ()) -> None:
+        self.chunks = iter(chunks)
+        self.path = tuple(path)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.found = False
+
+    def fill(self) -> bool:
+        if self.eof:
+            return False
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.eof = True
+            text = self.decoder.decode(b'', final=True)
+        else:
+            text = self.decoder.decode(chunk)
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise JSONStreamError('Unexpected end of data')
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if char not in chars:
+            raise JSONStreamError(f'Expected one of {chars!r}, got {char!r}')
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if (NUMBER_TAIL.match(self.buffer, end).end() == len(self.buffer)
+                    and self.fill()):
+                continue
+            self.pos = end
+            return value
+
+    def members(self) -> Iterator[str]:
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise JSONStreamError(f'Expected a key, got {key!r}')
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def elements(self) -> Iterator[None]:
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.expect(',]') == ']':
+                return
+
+    def skip(self) -> None:
+        char = self.peek()
+        if char == '{':
+            self.pos += 1
+            for _ in self.members():
+                self.skip()
+        elif char == '[':
+            self.pos += 1
+            for _ in self.elements():
+                self.skip()
+        else:
+            self.value()
+
+    def walk(self, path: Tuple[PathPart, ...]) -> Iterator[Any]:
+        if not path:
+            self.expect('[')
+            self.found = True
+            for _ in self.elements():
+                yield self.value()
+            return
+        self.expect('{')
+        part = path[0]
+        for key in self.members():
+            if part(key) if callable(part) else part == key:
+                for value in self.walk(path[1:]):
+                    yield value
+            else:
+                self.skip()
+
+    def __iter__(self) -> Iterator[Any]:
+        for value in self.walk(self.path):
+            yield value
+        if not self.found:
+            raise JSONStreamError(f'No array at {self.path!r}')
+        while self.fill():
+            pass
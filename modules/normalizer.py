@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import jaconv
+from pykakasi import kakasi
+
+
+class Normalizer:
+    def __init__(self, cache_size: Optional[int] = 65536) -> None:
+        self.kakasi = kakasi()
+        self.kakasi.setMode('J', 'H')
+        self.converter = self.kakasi.getConverter()
+
+        self.lock = threading.Lock()
+        self.converter_lock = threading.Lock()
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+
+    def convert(self, text: str, case_insensitive: bool, convert_kanji: bool) -> str:
+        if case_insensitive:
+            text = jaconv.kata2hira(text.casefold())
+        if convert_kanji:
+            with self.converter_lock:
+                text = self.converter.do(text)
+        return text
+
+    def normalize(self, text: str, case_insensitive: bool, convert_kanji: bool) -> str:
+        if not case_insensitive and not convert_kanji:
+            return text
+        key = (text, case_insensitive, convert_kanji)
+        with self.lock:
+            result = self.cache.get(key)
+            if result is not None:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return result
+            self.misses += 1
+
+        result = self.convert(text, case_insensitive, convert_kanji)
+        if self.cache_size:
+            with self.lock:
+                self.cache[key] = result
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return result
+
+    def normalize_many(self, texts: Iterable[Optional[str]],
+                       case_insensitive: bool, convert_kanji: bool) -> List[Optional[str]]:
+        # Catalog columns are deduplicated here instead of going through the
+        # cache, which is kept for the query texts
+        if not case_insensitive and not convert_kanji:
+            return list(texts)
+        results = {}
+        normalized = []
+        for text in texts:
+            if text is None:
+                normalized.append(None)
+                continue
+            result = results.get(text)
+            if result is None:
+                result = self.convert(text, case_insensitive, convert_kanji)
+                results[text] = result
+            normalized.append(result)
+        return normalized
+
+    def cache_info(self) -> Dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.cache),
+            'max_size': self.cache_size
+        }
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import sys
+from collections.abc import Mapping
+from typing import Any, Iterator, List, Optional
+
+
+BACKEND_TO_API_CONVERTER = {
+    'AthenaBackpack': 'backpack',
+    'AthenaPickaxe': 'pickaxe',
+    'AthenaItemWrap': 'wrap',
+    'AthenaGlider': 'glider',
+    'AthenaCharacter': 'outfit',
+    'AthenaPet': 'pet',
+    'AthenaMusicPack': 'music',
+    'AthenaLoadingScreen': 'loadingscreen',
+    'AthenaDance': 'emote',
+    'AthenaSpray': 'spray',
+    'AthenaEmoji': 'emoji',
+    'AthenaSkyDiveContrail': 'contrail',
+    'AthenaPetCarrier': 'petcarrier',
+    'AthenaToy': 'toy',
+    'AthenaConsumableEmote': 'consumableemote',
+    'AthenaBattleBus': 'battlebus',
+    'AthenaVictoryPose': 'ridethepony',
+    'BannerToken': 'banner'
+}
+ITEM_TYPES = [
+    'AthenaCharacter',
+    'AthenaBackpack',
+    'AthenaPet',
+    'AthenaPetCarrier',
+    'AthenaPickaxe',
+    'AthenaDance',
+    'AthenaEmoji',
+    'AthenaToy'
+]
+API_TO_BACKEND_CONVERTER = {
+    v: k for k, v in BACKEND_TO_API_CONVERTER.items()
+}
+BACKEND_TO_KEY_CONVERTER = {
+    'AthenaBackpack': 'backpack',
+    'AthenaPickaxe': 'pickaxe',
+    'AthenaItemWrap': 'wrap',
+    'AthenaGlider': 'glider',
+    'AthenaCharacter': 'outfit',
+    'AthenaPet': 'backpack',
+    'AthenaMusicPack': 'music',
+    'AthenaLoadingScreen': 'loadingscreen',
+    'AthenaDance': 'emote',
+    'AthenaSpray': 'emote',
+    'AthenaEmoji': 'emote',
+    'AthenaSkyDiveContrail': 'contrail',
+    'AthenaPetCarrier': 'backpack',
+    'AthenaToy': 'emote',
+    'AthenaConsumableEmote': 'emote',
+    'AthenaBattleBus': 'battlebus',
+    'AthenaVictoryPose': 'emote',
+    'BannerToken': 'banner'
+}
+BACKEND_TO_ID_CONVERTER = {
+    'AthenaCharacter': 'CID',
+    'AthenaBackpack': 'BID',
+    'AthenaPetCarrier': 'PetCarrier',
+    'AthenaPet': 'PetID',
+    'AthenaPickaxe': 'Pickaxe_ID',
+    'AthenaDance': 'EID',
+    'AthenaEmoji': 'Emoji',
+    'AthenaToy': 'Toy',
+    'AthenaConsumableEmote': 'EID',
+}
+
+
+class Record(Mapping):
+    # Read-only, slotted replacement for the catalog dicts. Supports the same
+    # record['key'] / record.get('key') access as the dicts it replaces
+    __slots__ = ()
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.__slots__:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__slots__)
+
+    def __len__(self) -> int:
+        return len(self.__slots__)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.to_dict()!r})'
+
+    def to_dict(self) -> dict:
+        data = {}
+        for key in self.__slots__:
+            value = getattr(self, key)
+            if isinstance(value, Record):
+                value = value.to_dict()
+            elif isinstance(value, list):
+                value = [v.to_dict() if isinstance(v, Record) else v for v in value]
+            data[key] = value
+        return data
+
+
+class ItemType(Record):
+    __slots__ = ('value', 'displayValue', 'backendValue')
+
+    def __init__(self, value: Optional[str], displayValue: Optional[str],
+                 backendValue: Optional[str]) -> None:
+        self.value = value and sys.intern(value)
+        self.displayValue = displayValue and sys.intern(displayValue)
+        self.backendValue = backendValue and sys.intern(backendValue)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ItemType':
+        return cls(data.get('value'), data.get('displayValue'), data.get('backendValue'))
+
+
+class Variant(Record):
+    __slots__ = ('name', 'variants')
+
+    def __init__(self, name: str, variants: List[dict]) -> None:
+        self.name = name
+        self.variants = variants
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Variant':
+        return cls(data['name'], data['variants'])
+
+
+class Cosmetic(Record):
+    __slots__ = ('id', 'name', 'type', 'set', 'variants')
+
+    def __init__(self, id: str, name: Optional[str], type: ItemType,
+                 set: Optional[str], variants: Optional[List[Variant]]) -> None:
+        self.id = id
+        self.name = name
+        self.type = type
+        self.set = set
+        self.variants = variants
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Cosmetic':
+        variants = data.get('variants')
+        return cls(
+            data['id'],
+            data['name'],
+            ItemType.from_dict(data['type']),
+            data.get('set'),
+            [Variant.from_dict(v) for v in variants] if variants is not None else None
+        )
+
+    @classmethod
+    def from_fields(cls, id: str, name: Optional[str], value: Optional[str],
+                    displayValue: Optional[str], backendValue: Optional[str],
+                    set: Optional[str], variants: Optional[List[dict]]) -> 'Cosmetic':
+        # Field order of snapshot.ITEM_FIELDS
+        return cls(
+            id,
+            name,
+            ItemType(value, displayValue, backendValue),
+            set,
+            [Variant.from_dict(v) for v in variants] if variants is not None else None
+        )
+
+
+class Playlist(Record):
+    __slots__ = ('id', 'name')
+
+    def __init__(self, id: str, name: Optional[str]) -> None:
+        self.id = id
+        self.name = name
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Playlist':
+        return cls(data['id'], data['name'])
+
+    @classmethod
+    def from_fields(cls, id: str, name: Optional[str]) -> 'Playlist':
+        # Field order of snapshot.PLAYLIST_FIELDS
+        return cls(id, name)
@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+import copy
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+MAGIC = b'LBCS'
+VERSION = 2
+NONE = 0xFFFFFFFF
+PREAMBLE = struct.Struct('<4sIII')
+
+ITEM_FIELDS = [
+    ('id',),
+    ('name',),
+    ('type', 'value'),
+    ('type', 'displayValue'),
+    ('type', 'backendValue'),
+    ('set',),
+    ('variants',)
+]
+PLAYLIST_FIELDS = [
+    ('id',),
+    ('name',)
+]
+BANNER_FIELDS = [
+    ()
+]
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def pad(size: int) -> int:
+    return (8 - size % 8) % 8
+
+
+def get_path(value: Any, path: Tuple[str, ...]) -> Any:
+    for key in path:
+        if value is None:
+            return None
+        value = value.get(key)
+    return value
+
+
+def write_snapshot(filename: str, data: Mapping, fields: List[Tuple[str, ...]],
+                   source_hash: Optional[str] = None) -> None:
+    strings = []
+    interned = {}
+
+    def intern(value: Optional[str]) -> int:
+        if value is None:
+            return NONE
+        num = interned.get(value)
+        if num is None:
+            num = interned[value] = len(strings)
+            strings.append(value)
+        return num
+
+    values = [[get_path(value, path) for value in data.values()] for path in fields]
+    encoded = [
+        any(field is not None and not isinstance(field, str) for field in column)
+        for column in values
+    ]
+    columns = [array('I', (intern(key.casefold()) for key in data.keys()))]
+    for column, json_column in zip(values, encoded):
+        if json_column:
+            column = [
+                json.dumps(field, ensure_ascii=False, separators=(',', ':'))
+                if field is not None else None
+                for field in column
+            ]
+        columns.append(array('I', (intern(field) for field in column)))
+
+    blob = bytearray()
+    offsets = array('Q', [0])
+    for string in strings:
+        blob += string.encode('utf-8')
+        offsets.append(len(blob))
+
+    # Everything after the header, in file order
+    sections = [column.tobytes() for column in columns]
+    sections.append(b'\0' * pad(4 * len(data) * len(columns)))
+    sections.append(offsets.tobytes())
+    sections.append(bytes(blob))
+    checksum = 0
+    for section in sections:
+        checksum = zlib.crc32(section, checksum)
+
+    # The checksums and the size of the data are checked on open, since
+    # source_hash only covers the JSON catalog the snapshot was made from
+    header = {
+        'count': len(data),
+        'strings': len(strings),
+        'fields': [list(path) for path in fields],
+        'json': encoded,
+        'source_hash': source_hash,
+        'data_size': sum(len(section) for section in sections),
+        'data_crc32': checksum
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b' ' * pad(PREAMBLE.size + len(header_bytes))
+
+    tmp = f'{filename}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, VERSION, len(header_bytes), zlib.crc32(header_bytes)))
+        f.write(header_bytes)
+        for section in sections:
+            f.write(section)
+    os.replace(tmp, filename)
+
+
+class Snapshot:
+    # factory builds a record from the fields of a row, in order. Without it
+    # records are nested dicts
+    def __init__(self, filename: str, factory: Optional[Callable[..., Any]] = None) -> None:
+        self.factory = factory
+        with open(filename, 'rb') as f:
+            try:
+                self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise SnapshotError(f'{filename} is empty') from e
+        view = memoryview(self.mmap)
+        if len(view) < PREAMBLE.size:
+            raise SnapshotError(f'{filename} is truncated')
+        magic, version, header_size, header_crc32 = PREAMBLE.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError(f'{filename} has unsupported format {magic!r} v{version}')
+        start = PREAMBLE.size
+        if start + header_size > len(view):
+            raise SnapshotError(f'{filename} is truncated')
+        if zlib.crc32(view[start:start + header_size]) != header_crc32:
+            raise SnapshotError(f'{filename} has a broken header')
+        try:
+            header = json.loads(bytes(view[start:start + header_size]))
+            self.count = header['count']
+            self.fields = [tuple(path) for path in header['fields']]
+            self.encoded = header['json']
+            self.source_hash = header['source_hash']
+            strings = header['strings']
+            data_size = header['data_size']
+            data_crc32 = header['data_crc32']
+        except (ValueError, KeyError, TypeError) as e:
+            raise SnapshotError(f'{filename} has a broken header') from e
+        start += header_size
+        if start + data_size != len(view):
+            raise SnapshotError(f'{filename} is {len(view)} bytes, expected {start + data_size}')
+        if zlib.crc32(view[start:]) != data_crc32:
+            raise SnapshotError(f'{filename} does not match its checksum')
+
+        size = 4 * self.count
+        self.columns = []
+        for num in range(len(self.fields) + 1):
+            self.columns.append(self.section(view, start, size).cast('I'))
+            start += size
+        start += pad(size * (len(self.fields) + 1))
+        self.offsets = self.section(view, start, 8 * (strings + 1)).cast('Q')
+        start += 8 * (strings + 1)
+        if self.offsets[0] != 0 or start + self.offsets[-1] != len(view):
+            raise SnapshotError(f'{filename} has a broken string table')
+        self.blob = view[start:]
+
+    @staticmethod
+    def section(view: memoryview, start: int, size: int) -> memoryview:
+        if start + size > len(view):
+            raise SnapshotError('Section out of bounds')
+        return view[start:start + size]
+
+    def string(self, num: int) -> Optional[str]:
+        if num == NONE:
+            return None
+        return str(self.blob[self.offsets[num]:self.offsets[num + 1]], 'utf-8')
+
+    def decode(self, string: int, num: int) -> Any:
+        value = self.string(string)
+        if value is not None and self.encoded[num]:
+            return json.loads(value)
+        return value
+
+    def field(self, row: int, num: int) -> Any:
+        return self.decode(self.columns[num + 1][row], num)
+
+    def column(self, path: Tuple[str, ...]) -> List[Any]:
+        # Equal values share one object, and strings are interned so that
+        # ids and types are also shared with the other language catalogs
+        num = self.fields.index(tuple(path))
+        values = {}
+        column = []
+        for string in self.columns[num + 1]:
+            value = values.get(string)
+            if value is None and string not in values:
+                value = self.decode(string, num)
+                if isinstance(value, str):
+                    value = sys.intern(value)
+                values[string] = value
+            column.append(value)
+        return column
+
+    def keys(self) -> List[str]:
+        return [sys.intern(self.string(num)) for num in self.columns[0]]
+
+    def record(self, row: int) -> Any:
+        if self.factory is not None:
+            return self.factory(*[self.field(row, num) for num in range(len(self.fields))])
+        value = None
+        for num, path in enumerate(self.fields):
+            field = self.field(row, num)
+            if not path:
+                return field
+            if value is None:
+                value = {}
+            target = value
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = field
+        return value
+
+
+class SnapshotRecords(Sequence):
+    def __init__(self, data: 'SnapshotDict', rows: Optional[List[int]] = None) -> None:
+        self.data = data
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows) if self.rows is not None else self.data.snapshot.count
+
+    def __getitem__(self, num: int) -> Any:
+        if isinstance(num, slice):
+            return [self[i] for i in range(*num.indices(len(self)))]
+        return self.data.record(self.rows[num] if self.rows is not None else num)
+
+    def __iter__(self) -> Iterator[Any]:
+        rows = self.rows if self.rows is not None else range(self.data.snapshot.count)
+        for row in rows:
+            yield self.data.record(row)
+
+
+class SnapshotDict(Mapping):
+    # Read-only, case-insensitive mapping. Records are only built into dicts
+    # when they are looked up
+    def __init__(self, filename: str, factory: Optional[Callable[..., Any]] = None) -> None:
+        self.snapshot = Snapshot(filename, factory)
+        self.index = {key: row for row, key in enumerate(self.snapshot.keys())}
+        # Set by apply. rows are the live rows in order, None for all rows of
+        # the snapshot, and overrides the records that replace or follow them
+        self.rows = None
+        self.size = self.snapshot.count
+        self.overrides = {}
+        self.convert = None
+        self.hashes = []
+        self.changes = []
+
+    @property
+    def source_hash(self) -> Optional[str]:
+        return self.snapshot.source_hash
+
+    def apply(self, deltas: List[Tuple[str, Mapping, List[str]]],
+              convert: Optional[Callable[[Any], Any]] = None) -> 'SnapshotDict':
+        # A copy with the (content_hash, updated, removed) deltas of the
+        # catalog journal laid over the snapshot. The changed records are kept
+        # as they were stored and converted when they are looked up
+        data = copy.copy(self)
+        data.index = dict(self.index)
+        data.overrides = dict(self.overrides)
+        data.convert = convert
+        data.hashes = list(self.hashes)
+        data.changes = list(self.changes)
+        for content_hash, updated, removed in deltas:
+            changes = set()
+            for key in removed:
+                key = sys.intern(key.casefold())
+                row = data.index.pop(key, None)
+                if row is not None:
+                    data.overrides.pop(row, None)
+                changes.add(key)
+            for key, value in updated.items():
+                key = sys.intern(key.casefold())
+                row = data.index.get(key)
+                if row is None:
+                    row = data.index[key] = data.size
+                    data.size += 1
+                data.overrides[row] = value
+                changes.add(key)
+            data.hashes.append(content_hash)
+            data.changes.append(changes)
+        data.rows = list(data.index.values())
+        return data
+
+    def changes_since(self, other: Mapping) -> Optional[set]:
+        # The keys changed since other, if it is an older state of the same
+        # catalog, else None
+        if (not isinstance(other, SnapshotDict)
+                or other.source_hash != self.source_hash
+                or self.hashes[:len(other.hashes)] != other.hashes):
+            return None
+        return set().union(*self.changes[len(other.hashes):])
+
+    def column(self, path: Tuple[str, ...]) -> List[Any]:
+        column = self.snapshot.column(path)
+        if self.rows is None:
+            return column
+        values = []
+        for row in self.rows:
+            value = self.overrides.get(row)
+            if value is None:
+                values.append(column[row])
+                continue
+            value = get_path(value, path)
+            if isinstance(value, str):
+                value = sys.intern(value)
+            values.append(value)
+        return values
+
+    def record(self, row: int) -> Any:
+        value = self.overrides.get(row)
+        if value is None:
+            return self.snapshot.record(row)
+        if self.convert is not None:
+            return self.convert(value)
+        return value
+
+    def records(self, rows: Optional[List[int]] = None) -> SnapshotRecords:
+        if self.rows is not None:
+            rows = self.rows if rows is None else [self.rows[row] for row in rows]
+        return SnapshotRecords(self, rows)
+
+    def __getitem__(self, k: str) -> Any:
+        if isinstance(k, str):
+            k = k.casefold()
+        return self.record(self.index[k])
+
+    def __contains__(self, k: object) -> bool:
+        if isinstance(k, str):
+            k = k.casefold()
+        return k in self.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def __len__(self) -> int:
+        if self.rows is not None:
+            return len(self.rows)
+        return self.snapshot.count
+
+    def values(self) -> SnapshotRecords:
+        return self.records()
@@ -0,0 +1,551 @@
+# -*- coding: utf-8 -*-
+import abc
+import asyncio
+import codecs
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .encoder import MyJSONEncoder
+
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
+MISSING = object()
+
+# Entries of a large dict encoded at a time by compact writes
+CHUNK_ENTRIES = 1024
+
+# Documents the sqlite storage keeps as one row per entry. config and
+# commands stay files since they are edited by hand
+STATE_DOCUMENTS = ('device_auths', 'cosmetic_presets')
+
+
+def json_options(compact: bool) -> dict:
+    if compact:
+        return {'ensure_ascii': False, 'cls': MyJSONEncoder}
+    return {'indent': 4, 'ensure_ascii': False, 'cls': MyJSONEncoder}
+
+
+def dump_entry(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, cls=MyJSONEncoder)
+
+
+def loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def is_utf8(data: bytes) -> bool:
+    try:
+        data.decode('utf-8')
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def read_json(filename: str) -> Any:
+    # Read once and parse the bytes as UTF-8, only decoding them again when
+    # they turn out to be Shift_JIS
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if data.startswith(codecs.BOM_UTF8):
+        data = data[len(codecs.BOM_UTF8):]
+    try:
+        return loads(data)
+    except UnicodeDecodeError:
+        pass
+    except ValueError:
+        # orjson reports invalid UTF-8 as a JSONDecodeError
+        if orjson is None or is_utf8(data):
+            raise
+    return json.loads(data.decode('shift_jis'))
+
+
+def write_text(filename: str, text: str) -> None:
+    tmp = f'{filename}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, filename)
+
+
+def iter_compact(value: Any, encoder: json.JSONEncoder) -> Iterator[str]:
+    # Each chunk is encoded in one shot so that the C encoder is used, but a
+    # catalog is never held as one string. Dicts over CHUNK_ENTRIES entries
+    # are encoded that many entries at a time, smaller ones holding such a
+    # dict are split per entry
+    if not isinstance(value, dict) or not all(isinstance(key, str) for key in value):
+        yield encoder.encode(value)
+    elif len(value) > CHUNK_ENTRIES:
+        items = iter(value.items())
+        separator = '{'
+        while True:
+            chunk = dict(islice(items, CHUNK_ENTRIES))
+            if not chunk:
+                break
+            yield separator + encoder.encode(chunk)[1:-1]
+            separator = encoder.item_separator
+        yield '}'
+    elif any(isinstance(v, dict) and len(v) > CHUNK_ENTRIES for v in value.values()):
+        separator = '{'
+        for key, v in value.items():
+            yield separator + encoder.encode(key) + encoder.key_separator
+            yield from iter_compact(v, encoder)
+            separator = encoder.item_separator
+        yield '}'
+    else:
+        yield encoder.encode(value)
+
+
+def write_json(filename: str, value: Any, compact: Optional[bool] = False) -> None:
+    tmp = f'{filename}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        if compact:
+            options = json_options(compact)
+            encoder = options.pop('cls')(**options)
+            for chunk in iter_compact(value, encoder):
+                f.write(chunk)
+        else:
+            json.dump(value, f, **json_options(compact))
+    os.replace(tmp, filename)
+
+
+def apply_entries(value: dict, entries: Dict[str, Optional[str]]) -> dict:
+    # Entries are JSON text, None removes the entry
+    for entry, text in entries.items():
+        if text is None:
+            value.pop(entry, None)
+        else:
+            value[entry] = json.loads(text)
+    return value
+
+
+class Storage(abc.ABC):
+    # Backend of Bot.isfile/load_json/save_json/remove/rename. Documents are
+    # saved as JSON text. Entries are the top-level keys of a dict document,
+    # backends that keep one row per entry return True from has_entries
+    @abc.abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    @abc.abstractmethod
+    def load(self, key: str) -> Any:
+        pass
+
+    @abc.abstractmethod
+    def save(self, key: str, text: str) -> None:
+        pass
+
+    @abc.abstractmethod
+    def remove(self, key: str) -> None:
+        pass
+
+    @abc.abstractmethod
+    def rename(self, key_src: str, key_dst: str) -> None:
+        pass
+
+    @abc.abstractmethod
+    def last_edited(self, key: str) -> datetime.datetime:
+        pass
+
+    def has_entries(self, key: str) -> bool:
+        return False
+
+    @abc.abstractmethod
+    def save_entries(self, key: str, entries: Dict[str, Optional[str]]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class FileStorage(Storage):
+    @staticmethod
+    def filename(key: str) -> str:
+        return f'{key}.json'
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.filename(key))
+
+    def load(self, key: str) -> Any:
+        return read_json(self.filename(key))
+
+    def save(self, key: str, text: str) -> None:
+        write_text(self.filename(key), text)
+
+    def save_entries(self, key: str, entries: Dict[str, Optional[str]]) -> None:
+        # The document is one file, so it is rewritten whole
+        value = self.load(key) if self.exists(key) else {}
+        write_json(self.filename(key), apply_entries(value, entries))
+
+    def remove(self, key: str) -> None:
+        os.remove(self.filename(key))
+
+    def rename(self, key_src: str, key_dst: str) -> None:
+        os.rename(self.filename(key_src), self.filename(key_dst))
+
+    def last_edited(self, key: str) -> datetime.datetime:
+        stat = os.stat(self.filename(key))
+        return datetime.datetime.fromtimestamp(stat.st_mtime)
+
+
+class ReplitStorage(Storage):
+    def __init__(self, db: Any) -> None:
+        self.db = db
+
+    def exists(self, key: str) -> bool:
+        return self.db.get(key) is not None
+
+    def load(self, key: str) -> Any:
+        return self.db[key]['value']
+
+    def save(self, key: str, text: str) -> None:
+        self.db[key] = {
+            'last_edited': datetime.datetime.utcnow().isoformat(),
+            'value': json.loads(text)
+        }
+
+    def save_entries(self, key: str, entries: Dict[str, Optional[str]]) -> None:
+        value = dict(self.load(key)) if self.exists(key) else {}
+        self.db[key] = {
+            'last_edited': datetime.datetime.utcnow().isoformat(),
+            'value': apply_entries(value, entries)
+        }
+
+    def remove(self, key: str) -> None:
+        try:
+            del self.db[key]
+        except KeyError as e:
+            raise FileNotFoundError from e
+
+    def rename(self, key_src: str, key_dst: str) -> None:
+        try:
+            self.db[key_dst] = self.db[key_src]
+            del self.db[key_src]
+        except KeyError as e:
+            raise FileNotFoundError from e
+
+    def last_edited(self, key: str) -> datetime.datetime:
+        return datetime.datetime.fromisoformat(self.db[key]['last_edited'])
+
+
+class SQLiteStorage(Storage):
+    # Keeps the documents listed in documents as one row per entry, so that
+    # updating an account rewrites that row only. Other keys are passed to
+    # fallback. A document that only exists in fallback is imported on first
+    # access, and its row takes precedence from then on
+    def __init__(self, filename: str, documents: Iterable[str],
+                 fallback: Storage) -> None:
+        self.documents = frozenset(documents)
+        self.fallback = fallback
+        self.lock = threading.Lock()
+        # Writes run in the store's worker thread
+        self.connection = sqlite3.connect(
+            filename,
+            check_same_thread=False,
+            isolation_level=None
+        )
+        with self.lock:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS documents ('
+                'key TEXT PRIMARY KEY, last_edited REAL NOT NULL)'
+            )
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT NOT NULL, entry TEXT NOT NULL, value TEXT NOT NULL, '
+                'PRIMARY KEY (key, entry)) WITHOUT ROWID'
+            )
+
+    def has_entries(self, key: str) -> bool:
+        return key in self.documents
+
+    def has_row(self, key: str) -> bool:
+        cursor = self.connection.execute('SELECT 1 FROM documents WHERE key = ?', (key,))
+        return cursor.fetchone() is not None
+
+    def write(self, key: str, entries: Dict[str, Optional[str]],
+              replace: bool = False) -> None:
+        # Caller holds the lock
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            if replace:
+                self.connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self.connection.execute(
+                'INSERT OR REPLACE INTO documents (key, last_edited) VALUES (?, ?)',
+                (key, time.time())
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO entries (key, entry, value) VALUES (?, ?, ?)',
+                [(key, entry, value) for entry, value in entries.items() if value is not None]
+            )
+            self.connection.executemany(
+                'DELETE FROM entries WHERE key = ? AND entry = ?',
+                [(key, entry) for entry, value in entries.items() if value is None]
+            )
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    def delete(self, key: str) -> bool:
+        # Caller holds the lock
+        removed = self.has_row(key)
+        self.connection.execute('BEGIN IMMEDIATE')
+        self.connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+        self.connection.execute('DELETE FROM documents WHERE key = ?', (key,))
+        self.connection.execute('COMMIT')
+        return removed
+
+    def import_document(self, key: str) -> None:
+        # Caller holds the lock
+        if self.has_row(key) or not self.fallback.exists(key):
+            return
+        value = self.fallback.load(key)
+        self.write(key, {entry: dump_entry(v) for entry, v in value.items()}, replace=True)
+
+    def exists(self, key: str) -> bool:
+        if key not in self.documents:
+            return self.fallback.exists(key)
+        with self.lock:
+            return self.has_row(key) or self.fallback.exists(key)
+
+    def load(self, key: str) -> Any:
+        if key not in self.documents:
+            return self.fallback.load(key)
+        with self.lock:
+            self.import_document(key)
+            if not self.has_row(key):
+                raise FileNotFoundError(key)
+            cursor = self.connection.execute(
+                'SELECT entry, value FROM entries WHERE key = ?',
+                (key,)
+            )
+            return {entry: json.loads(value) for entry, value in cursor}
+
+    def save(self, key: str, text: str) -> None:
+        if key not in self.documents:
+            return self.fallback.save(key, text)
+        value = json.loads(text)
+        with self.lock:
+            self.write(key, {entry: dump_entry(v) for entry, v in value.items()}, replace=True)
+
+    def save_entries(self, key: str, entries: Dict[str, Optional[str]]) -> None:
+        if key not in self.documents:
+            return self.fallback.save_entries(key, entries)
+        with self.lock:
+            self.import_document(key)
+            self.write(key, entries)
+
+    def remove(self, key: str) -> None:
+        if key not in self.documents:
+            return self.fallback.remove(key)
+        with self.lock:
+            removed = self.delete(key)
+        # The file would be imported again otherwise
+        if self.fallback.exists(key):
+            self.fallback.remove(key)
+        elif not removed:
+            raise FileNotFoundError(key)
+
+    def rename(self, key_src: str, key_dst: str) -> None:
+        if key_src not in self.documents and key_dst not in self.documents:
+            return self.fallback.rename(key_src, key_dst)
+        with self.lock:
+            has_row = key_src in self.documents and self.has_row(key_src)
+            if not has_row and key_dst in self.documents:
+                self.delete(key_dst)
+        if not has_row:
+            # Not imported, possibly because the file is broken
+            return self.fallback.rename(key_src, key_dst)
+        self.save(key_dst, json.dumps(self.load(key_src), **json_options(False)))
+        self.remove(key_src)
+
+    def last_edited(self, key: str) -> datetime.datetime:
+        if key in self.documents:
+            with self.lock:
+                cursor = self.connection.execute(
+                    'SELECT last_edited FROM documents WHERE key = ?',
+                    (key,)
+                )
+                row = cursor.fetchone()
+            if row is not None:
+                return datetime.datetime.fromtimestamp(row[0])
+        return self.fallback.last_edited(key)
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+class JSONStore:
+    # Write-behind store in front of a Storage. The values held here are the
+    # current state of their documents, a save only marks its key dirty. The
+    # first save of a burst starts a flusher which, delay seconds later,
+    # writes every dirty key once in a worker thread. For backends with per
+    # entry rows, set_entry and remove_entry only write the entries changed.
+    # Values are encoded on the loop so that they are not mutated while they
+    # are being written
+    def __init__(self, loop: asyncio.AbstractEventLoop, backend: Storage,
+                 delay: float = 1.0,
+                 on_error: Optional[Callable[[Exception], None]] = None) -> None:
+        self.loop = loop
+        self.backend = backend
+        self.delay = delay
+        self.on_error = on_error
+        self.values = {}
+        self.dirty: Dict[str, bool] = {}
+        self.dirty_entries: Dict[str, set] = {}
+        self.flusher = None
+        self.lock = None
+        # Held for every write to the backend. The flusher takes it on the
+        # loop and its worker thread releases it, so a synchronous flush waits
+        # for a write that holds older values
+        self.write_lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.values
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.values.get(key, default)
+
+    def load(self, key: str, value: Any) -> None:
+        self.values[key] = value
+
+    def discard(self, key: str) -> bool:
+        self.dirty.pop(key, None)
+        self.dirty_entries.pop(key, None)
+        return self.values.pop(key, MISSING) is not MISSING
+
+    def in_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def schedule(self, key: str) -> None:
+        if not self.in_loop():
+            # Nothing would run the flusher
+            self.flush_sync([key])
+        elif self.flusher is None:
+            self.flusher = self.loop.create_task(self.flush_later())
+
+    def set(self, key: str, value: Any, compact: Optional[bool] = False) -> None:
+        self.values[key] = value
+        self.dirty[key] = compact
+        self.dirty_entries.pop(key, None)
+        self.schedule(key)
+
+    def set_entry(self, key: str, entry: str, value: Any) -> None:
+        self.values[key][entry] = value
+        self.mark_entry(key, entry)
+
+    def remove_entry(self, key: str, entry: str) -> Any:
+        value = self.values[key].pop(entry, None)
+        self.mark_entry(key, entry)
+        return value
+
+    def mark_entry(self, key: str, entry: str) -> None:
+        if key in self.dirty or not self.backend.has_entries(key):
+            self.dirty.setdefault(key, False)
+        else:
+            self.dirty_entries.setdefault(key, set()).add(entry)
+        self.schedule(key)
+
+    def take(self, keys: Optional[Iterable[str]] = None) -> Tuple[dict, dict]:
+        if keys is None:
+            dirty, self.dirty = self.dirty, {}
+            dirty_entries, self.dirty_entries = self.dirty_entries, {}
+        else:
+            dirty = {key: self.dirty.pop(key) for key in keys if key in self.dirty}
+            dirty_entries = {
+                key: self.dirty_entries.pop(key)
+                for key in keys if key in self.dirty_entries
+            }
+        return dirty, dirty_entries
+
+    def restore(self, dirty: dict, dirty_entries: dict) -> None:
+        for key, compact in dirty.items():
+            if key in self.values:
+                self.dirty.setdefault(key, compact)
+        for key, entries in dirty_entries.items():
+            if key in self.values and key not in self.dirty:
+                self.dirty_entries.setdefault(key, set()).update(entries)
+
+    def encode(self, dirty: dict, dirty_entries: dict) -> List[Tuple[str, Any]]:
+        writes = [
+            (key, json.dumps(self.values[key], **json_options(compact)))
+            for key, compact in dirty.items()
+        ]
+        for key, entries in dirty_entries.items():
+            value = self.values[key]
+            writes.append((key, {
+                entry: dump_entry(value[entry]) if entry in value else None
+                for entry in entries
+            }))
+        return writes
+
+    def write(self, writes: List[Tuple[str, Any]]) -> None:
+        for key, data in writes:
+            if isinstance(data, str):
+                self.backend.save(key, data)
+            else:
+                self.backend.save_entries(key, data)
+
+    def write_locked(self, writes: List[Tuple[str, Any]]) -> None:
+        try:
+            self.write(writes)
+        finally:
+            self.write_lock.release()
+
+    def flush_sync(self, keys: Optional[Iterable[str]] = None) -> None:
+        writes = self.encode(*self.take(keys))
+        if writes:
+            with self.write_lock:
+                self.write(writes)
+
+    async def flush(self) -> None:
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            dirty, dirty_entries = self.take()
+            if not dirty and not dirty_entries:
+                return
+            try:
+                writes = self.encode(dirty, dirty_entries)
+                self.write_lock.acquire()
+                try:
+                    future = self.loop.run_in_executor(None, self.write_locked, writes)
+                except BaseException:
+                    self.write_lock.release()
+                    raise
+                await future
+            except Exception:
+                self.restore(dirty, dirty_entries)
+                raise
+
+    async def flush_later(self) -> None:
+        await asyncio.sleep(self.delay)
+        self.flusher = None
+        try:
+            # A write that has started is not interrupted by close()
+            await asyncio.shield(self.flush())
+        except Exception as e:
+            if self.on_error is None:
+                raise
+            self.on_error(e)
+
+    async def close(self) -> None:
+        if self.flusher is not None:
+            self.flusher.cancel()
+            self.flusher = None
+        await self.flush()